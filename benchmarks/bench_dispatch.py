@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Benchmarks dispatching parsed messages to N handlers, without any network I/O.
+"""
+
+from gevent.queue import Queue
+
+from fatbotslim.handlers import BaseHandler, CommandHandler, EVT_PUBLIC, EVT_PRIVATE
+from fatbotslim.irc.bot import IRC, Message
+from fatbotslim.irc.codes import PRIVMSG, RPL_NAMREPLY
+
+from benchmarks.utils import measure
+
+
+class NullConnection(object):
+    """
+    Stands for a :class:`fatbotslim.irc.tcp.TCP` connection, lines sent by the
+    bot are dropped.
+    """
+
+    class _NullQueue(Queue):
+        def put(self, item, block=True, timeout=None):
+            pass
+
+    def __init__(self):
+        self.iqueue = Queue()
+        self.oqueue = self._NullQueue()
+
+
+def make_command_handler(index):
+    """
+    Creates a command handler class reacting to ``!cmd<index>``.
+    """
+    trigger = 'cmd{0}'.format(index)
+
+    def method(self, msg):
+        self.irc.msg(msg.dst, u'ok')
+
+    return type('Command{0}'.format(index), (CommandHandler,), {
+        'triggers': {trigger: [EVT_PUBLIC, EVT_PRIVATE]},
+        trigger: method,
+    })
+
+
+class ChatLogger(BaseHandler):
+    """
+    Reacts to every PRIVMSG and NAMES reply, like a logging plugin would.
+    """
+    commands = {
+        PRIVMSG: 'log',
+        RPL_NAMREPLY: 'log',
+    }
+
+    def log(self, msg):
+        msg.args
+
+
+def make_bot(handlers_count, sync_dispatch=False):
+    """
+    Creates a bot with `handlers_count` command handlers and a chat logger.
+    """
+    bot = IRC({
+        'server': 'localhost',
+        'port': 6667,
+        'ssl': False,
+        'channels': [],
+        'nick': 'bot',
+        'realname': 'benchmark',
+        'sync_dispatch': sync_dispatch,
+        'loglevel': 'ERROR',
+    })
+    bot.conn = NullConnection()
+    bot.add_handler(ChatLogger)
+    for index in range(handlers_count):
+        bot.add_handler(make_command_handler(index))
+    return bot
+
+
+def run(corpus_name, corpus, handlers_counts=(1, 10, 40)):
+    """
+    :param corpus_name: name of the corpus, used in the results.
+    :type corpus_name: str
+    :param corpus: raw lines to process.
+    :type corpus: list
+    :param handlers_counts: amounts of command handlers to benchmark with.
+    :type handlers_counts: tuple
+    :return: benchmarks results.
+    :rtype: list
+    """
+    decoded = [line.decode('utf-8', 'replace') for line in corpus]
+    results = []
+    for handlers_count in handlers_counts:
+        for sync_dispatch in (False, True):
+            bot = make_bot(handlers_count, sync_dispatch)
+
+            def dispatch(line):
+                bot._handle(Message(line))
+                bot._pool.join()
+
+            results.append(measure(
+                'dispatch({0} handlers, {1})/{2}'.format(
+                    handlers_count, 'sync' if sync_dispatch else 'chained', corpus_name
+                ),
+                dispatch, decoded, keep_results=False
+            ))
+    return results
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Benchmarks the receive and send paths against a loopback fake ircd.
+"""
+
+import time
+
+import gevent
+from gevent.server import StreamServer
+
+from fatbotslim.irc.tcp import TCP
+
+from benchmarks.utils import Result
+
+
+def _serve(corpus, chunk_lines=200):
+    """
+    Creates a fake ircd that sends `corpus` to each client, by chunks of
+    `chunk_lines` lines, then reads everything the client sends.
+    """
+    chunks = [
+        ''.join(line + '\r\n' for line in corpus[index:index + chunk_lines])
+        for index in range(0, len(corpus), chunk_lines)
+    ]
+    received = []
+
+    def handle(sock, _):
+        for chunk in chunks:
+            sock.sendall(chunk)
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            received.append(len(data))
+
+    server = StreamServer(('127.0.0.1', 0), handle)
+    server.start()
+    return server, received
+
+
+def run(corpus_name, corpus):
+    """
+    :param corpus_name: name of the corpus, used in the results.
+    :type corpus_name: str
+    :param corpus: raw lines to process.
+    :type corpus: list
+    :return: benchmarks results.
+    :rtype: list
+    """
+    server, received = _serve(corpus)
+    try:
+        conn = TCP('127.0.0.1', server.server_port)
+        job = gevent.spawn(conn.connect)
+
+        start = time.time()
+        for _ in corpus:
+            conn.iqueue.get()
+        recv_result = Result('recv/{0}'.format(corpus_name), len(corpus), time.time() - start)
+
+        expected = sum(len(line) + 2 for line in corpus)
+        start = time.time()
+        for line in corpus:
+            conn.oqueue.put(line)
+        while sum(received) < expected:
+            gevent.sleep(0.001)
+        send_result = Result('send/{0}'.format(corpus_name), len(corpus), time.time() - start)
+
+        job.kill()
+        conn.disconnect()
+    finally:
+        server.stop()
+    return [recv_result, send_result]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Benchmarks decoding and parsing of received lines.
+"""
+
+from fatbotslim.irc import Decoder
+from fatbotslim.irc.bot import Message
+
+from benchmarks.utils import measure
+
+
+def parse_only(line):
+    message = Message(line)
+    message.command
+    return message
+
+
+def parse_full(line):
+    message = Message(line)
+    message.command, message.dst, message.args
+    message.src.name, message.src.host
+    return message
+
+
+def run(corpus_name, corpus):
+    """
+    :param corpus_name: name of the corpus, used in the results.
+    :type corpus_name: str
+    :param corpus: raw lines to process.
+    :type corpus: list
+    :return: benchmarks results.
+    :rtype: list
+    """
+    decoder = Decoder()
+    decoded = [decoder.decode(line, Decoder.source_key(line), errors='replace') for line in corpus]
+    return [
+        measure(
+            'decode/{0}'.format(corpus_name),
+            lambda line: decoder.decode(line, Decoder.source_key(line), errors='replace'),
+            corpus
+        ),
+        measure('parse(command)/{0}'.format(corpus_name), parse_only, decoded),
+        measure('parse(all fields)/{0}'.format(corpus_name), parse_full, decoded),
+    ]
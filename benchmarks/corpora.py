@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+IRC traffic corpora replayed by the benchmarks.
+
+A corpus is a list of raw lines (:class:`str`, without line endings), as they
+are received from the server. Recorded traffic can be replayed by saving it to
+a file (one line per line, as logged by the bot at debug level) and loading it
+with :func:`load`. Synthetic corpora are generated with a fixed seed, so that
+results are comparable between runs.
+"""
+
+import random
+
+
+NICKS = ['nick%d' % i for i in range(500)]
+WORDS = (
+    'the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet '
+    'what do you think about it anyway café déjà vu naïve'
+).split()
+
+
+def _source(rand):
+    nick = rand.choice(NICKS)
+    return ':{0}!~{0}@host-{1}.example.net'.format(nick, rand.randint(1, 255))
+
+
+def _sentence(rand, min_words=3, max_words=20):
+    return ' '.join(rand.choice(WORDS) for _ in range(rand.randint(min_words, max_words)))
+
+
+def privmsg_flood(count=20000, seed=42):
+    """
+    Busy channels chat, with about 2% of the lines being ``!commands``.
+    """
+    rand = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        channel = '#chan%d' % rand.randint(1, 20)
+        text = _sentence(rand)
+        if rand.random() < 0.02:
+            text = '!{0} {1}'.format(rand.choice(('help', 'hello', 'weather', 'seen')), text)
+        lines.append('{0} PRIVMSG {1} :{2}'.format(_source(rand), channel, text))
+    return lines
+
+
+def names_burst(count=20000, seed=42):
+    """
+    ``RPL_NAMREPLY`` replies for large channels, as received when joining them.
+    """
+    rand = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        names = ' '.join(rand.choice(('', '@', '+')) + rand.choice(NICKS) for _ in range(40))
+        lines.append(':irc.example.net 353 bot = #big{0} :{1}'.format(rand.randint(1, 5), names))
+        if rand.random() < 0.01:
+            lines.append(':irc.example.net 366 bot #big :End of /NAMES list.')
+    return lines[:count]
+
+
+def ctcp_storm(count=20000, seed=42):
+    """
+    CTCP requests flood, mixed with PINGs from the server.
+    """
+    rand = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        if rand.random() < 0.05:
+            lines.append('PING :irc.example.net')
+            continue
+        request = rand.choice(('\x01VERSION\x01', '\x01TIME\x01', '\x01PING 123456\x01', '\x01SOURCE\x01'))
+        lines.append('{0} PRIVMSG bot :{1}'.format(_source(rand), request))
+    return lines
+
+
+CORPORA = {
+    'privmsg_flood': privmsg_flood,
+    'names_burst': names_burst,
+    'ctcp_storm': ctcp_storm,
+}
+
+
+def load(path):
+    """
+    Loads a recorded corpus.
+
+    :param path: path of a file containing one raw line per line.
+    :type path: str
+    :return: the corpus.
+    :rtype: list
+    """
+    with open(path, 'rb') as corpus_file:
+        return [line.rstrip('\r\n') for line in corpus_file if line.strip()]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Runs the benchmarks suite and prints the results.
+
+Usage::
+
+    python -m benchmarks.run [-n LINES] [-c CORPUS] [-f FILE] [-b BENCHMARK]
+"""
+
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+
+from benchmarks import bench_dispatch, bench_network, bench_parse, corpora
+
+BENCHMARKS = {
+    'parse': bench_parse.run,
+    'dispatch': bench_dispatch.run,
+    'network': bench_network.run,
+}
+
+
+def make_parser():
+    parser = ArgumentParser(
+        description='Run the FatBotSlim micro-benchmarks.',
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '-n', '--lines',
+        metavar='LINES',
+        type=int,
+        default=20000,
+        help='amount of lines in generated corpora'
+    )
+    parser.add_argument(
+        '-c', '--corpus',
+        metavar='CORPUS',
+        nargs='*',
+        choices=sorted(corpora.CORPORA),
+        default=sorted(corpora.CORPORA),
+        help='generated corpora to replay'
+    )
+    parser.add_argument(
+        '-f', '--file',
+        metavar='FILE',
+        nargs='*',
+        default=[],
+        help='recorded corpora files to replay'
+    )
+    parser.add_argument(
+        '-b', '--benchmark',
+        metavar='BENCHMARK',
+        nargs='*',
+        choices=sorted(BENCHMARKS),
+        default=sorted(BENCHMARKS),
+        help='benchmarks to run'
+    )
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+    replayed = [(name, corpora.CORPORA[name](args.lines)) for name in args.corpus]
+    replayed.extend((path, corpora.load(path)) for path in args.file)
+    for benchmark in args.benchmark:
+        for corpus_name, corpus in replayed:
+            for result in BENCHMARKS[benchmark](corpus_name, corpus):
+                print result
+
+
+if __name__ == '__main__':
+    main()
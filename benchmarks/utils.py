@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Measurement helpers shared by the benchmarks.
+"""
+
+import gc
+import time
+
+
+def percentile(sorted_values, ratio):
+    """
+    :param sorted_values: sorted measurements.
+    :type sorted_values: list
+    :param ratio: percentile to compute, between 0 and 1.
+    :type ratio: float
+    :return: the value at the given percentile.
+    :rtype: float
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(ratio * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Result(object):
+    """
+    Measurements of a benchmark run.
+    """
+
+    def __init__(self, name, lines, elapsed, latencies=None, live_objects=None):
+        """
+        :param name: benchmark name.
+        :type name: str
+        :param lines: amount of lines processed.
+        :type lines: int
+        :param elapsed: total run time, in seconds.
+        :type elapsed: float
+        :param latencies: per-line processing times, in seconds.
+        :type latencies: list or None
+        :param live_objects: GC-tracked objects created during the run and still alive at its end.
+        :type live_objects: int or None
+        """
+        self.name = name
+        self.lines = lines
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies) if latencies else []
+        self.live_objects = live_objects
+
+    @property
+    def lines_per_sec(self):
+        return self.lines / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        parts = ['{0:<40} {1:>12,.0f} lines/s'.format(self.name, self.lines_per_sec)]
+        if self.latencies:
+            parts.append('p50 {0:>8.2f}us'.format(percentile(self.latencies, 0.5) * 1e6))
+            parts.append('p99 {0:>8.2f}us'.format(percentile(self.latencies, 0.99) * 1e6))
+        if self.live_objects is not None:
+            parts.append('{0:>6.2f} live objects/line'.format(float(self.live_objects) / self.lines))
+        return '  '.join(parts)
+
+
+def measure(name, func, items, keep_results=True):
+    """
+    Calls `func` on each item, timing every call.
+
+    When `keep_results` is set, the results are kept alive until the end of the run
+    and the amount of GC-tracked objects (containers, instances) they hold is measured,
+    with the garbage collector disabled. Objects freed during the run aren't counted,
+    so nothing is reported for functions whose results are dropped.
+
+    :param name: benchmark name.
+    :type name: str
+    :param func: function to benchmark.
+    :type func: callable
+    :param items: arguments to pass to `func`, one call per item.
+    :type items: list
+    :param keep_results: keep the values returned by `func` alive during the run,
+        and count the objects they hold.
+    :type keep_results: bool
+    :return: the run's measurements.
+    :rtype: :class:`benchmarks.utils.Result`
+    """
+    timer = time.time
+    latencies = []
+    results = []
+    gc.collect()
+    gc.disable()
+    try:
+        live_objects = len(gc.get_objects()) if keep_results else None
+        start = timer()
+        for item in items:
+            before = timer()
+            result = func(item)
+            latencies.append(timer() - before)
+            if keep_results:
+                results.append(result)
+        elapsed = timer() - start
+        if keep_results:
+            live_objects = len(gc.get_objects()) - live_objects
+    finally:
+        gc.enable()
+    return Result(name, len(items), elapsed, latencies, live_objects)
@@ -25,10 +25,16 @@ and allow creation of custom handlers.
 """
 
 import platform
+import re
 from datetime import datetime
 from collections import defaultdict
+from functools import partial, wraps
 
-from fatbotslim import NAME, VERSION, URL
+from gevent import spawn, get_hub
+from gevent.event import Event
+
+from fatbotslim import NAME, VERSION, URL, offload as offload_pool
+from fatbotslim.storage import BatchWriter
 from fatbotslim.irc.codes import *
 from fatbotslim.log import create_logger
 
@@ -36,6 +42,212 @@ EVT_PUBLIC = 'public'
 EVT_PRIVATE = 'private'
 EVT_NOTICE = 'notice'
 
+#: Bit used for each event type in the compiled rights.
+EVENT_BITS = {
+    EVT_PUBLIC: 1,
+    EVT_PRIVATE: 2,
+    EVT_NOTICE: 4,
+}
+ALL_EVENTS = sum(EVENT_BITS.itervalues())
+
+
+def event_mask(event_types):
+    """
+    :param event_types: event types.
+    :type event_types: list
+    :return: bitmask of the event types (see :data:`EVENT_BITS`).
+    :rtype: int
+    """
+    return sum(EVENT_BITS.get(event, 0) for event in set(event_types))
+
+
+def is_hostmask(user):
+    """
+    Tells if a restriction's user is a hostmask pattern (like ``*!*@trusted.host``)
+    rather than a nickname.
+
+    :param user: user of the restriction.
+    :type user: str
+    :rtype: bool
+    """
+    return (user != '*') and any(c in user for c in '!@*?')
+
+
+def normalize_hostmask(mask):
+    """
+    Completes the missing parts of a hostmask pattern like in ban masks
+    (``nick`` becomes ``nick!*@*``, ``user@host`` becomes ``*!user@host``).
+
+    :param mask: hostmask pattern.
+    :type mask: str
+    :return: the complete ``nick!user@host`` pattern.
+    :rtype: str
+    """
+    if u'!' not in mask:
+        if u'@' not in mask:
+            return mask + u'!*@*'
+        return (u'*!' + mask) if mask.index(u'@') else (u'*!*' + mask)
+    if u'@' not in mask:
+        return mask + u'@*'
+    return mask
+
+
+def hostmask_regex(mask):
+    """
+    Converts a hostmask pattern to a regular expression, missing parts of the mask are
+    completed like in ban masks (see :func:`normalize_hostmask`).
+
+    :param mask: hostmask pattern, where ``*`` matches any string and ``?`` any character.
+    :type mask: str
+    :return: regular expression matching the same ``nick!user@host`` strings.
+    :rtype: str
+    """
+    mask = normalize_hostmask(mask)
+    return re.escape(mask).replace(u'\\*', u'.*').replace(u'\\?', u'.')
+
+
+class RightsTable(object):
+    """
+    Compiled restrictions of a command, updated incrementally.
+
+    Nicknames, ``*!*@host`` patterns and ``*!*@*.domain`` patterns (the bulk of ban lists)
+    are looked up in dictionaries. The other hostmask patterns allowing the same events
+    are compiled into a single regular expression, only when one of them changed.
+    Patterns written differently but matching the same host (like ``*!*@host`` and
+    ``*@host``) share a dictionary entry, and the events they allow are intersected.
+    All the names given to this class must already be folded.
+    """
+
+    def __init__(self):
+        self.allowed = {}
+        self.nicks = {}
+        self.hosts = {}
+        self.domains = {}
+        self._patterns = defaultdict(dict)
+        self._matchers = {}
+        self._dirty = set()
+
+    def __len__(self):
+        return len(self.allowed)
+
+    @staticmethod
+    def _index(user):
+        """
+        :return: the dictionary `user` is indexed in, and its key in it,
+            or `None` and the regular expression of the pattern.
+        :rtype: tuple
+        """
+        if not is_hostmask(user):
+            return 'nicks', user
+        mask = normalize_hostmask(user)
+        if mask.startswith(u'*!*@'):
+            host = mask[4:]
+            if not any(c in host for c in u'!@*?'):
+                return 'hosts', host
+            if host.startswith(u'*.') and not any(c in host[2:] for c in u'!@*?'):
+                return 'domains', host[1:]
+        return None, hostmask_regex(mask)
+
+    def add(self, user, allowed):
+        """
+        Sets the events `user` is allowed to use the command on.
+
+        :param user: folded nickname or hostmask pattern.
+        :type user: unicode
+        :param allowed: bitmask of the allowed events.
+        :type allowed: int
+        """
+        self.remove(user)
+        self.allowed[user] = allowed
+        index, key = self._index(user)
+        if index is None:
+            self._patterns[allowed][user] = key
+            self._dirty.add(allowed)
+        elif index == 'nicks':
+            self.nicks[key] = allowed
+        else:
+            getattr(self, index).setdefault(key, {})[user] = allowed
+
+    def remove(self, user):
+        """
+        Removes the restriction of `user`, if any.
+
+        :param user: folded nickname or hostmask pattern.
+        :type user: unicode
+        """
+        allowed = self.allowed.pop(user, None)
+        if allowed is None:
+            return
+        index, key = self._index(user)
+        if index is None:
+            patterns = self._patterns[allowed]
+            del patterns[user]
+            if not patterns:
+                del self._patterns[allowed]
+            self._dirty.add(allowed)
+        elif index == 'nicks':
+            del self.nicks[key]
+        else:
+            users = getattr(self, index)[key]
+            del users[user]
+            if not users:
+                del getattr(self, index)[key]
+
+    def _compile(self):
+        """
+        Compiles the regular expressions of the groups of patterns that changed.
+        """
+        for allowed in self._dirty:
+            patterns = self._patterns.get(allowed)
+            if patterns:
+                self._matchers[allowed] = re.compile(
+                    u'(?:{0})\\Z'.format(u'|'.join(patterns.itervalues())), re.UNICODE
+                ).match
+            else:
+                self._matchers.pop(allowed, None)
+        self._dirty.clear()
+
+    def check(self, nick, user, host):
+        """
+        Computes the events an user is allowed to use the command on.
+
+        :param nick: folded nickname of the user.
+        :type nick: unicode
+        :param user: folded username of the user.
+        :type user: unicode
+        :param host: folded host of the user.
+        :type host: unicode
+        :return: bitmask of the allowed events.
+        :rtype: int
+        """
+        if nick in self.nicks:
+            return self.nicks[nick]
+        allowed, matched = ALL_EVENTS, False
+        if host in self.hosts:
+            for host_allowed in self.hosts[host].itervalues():
+                allowed &= host_allowed
+            matched = True
+        if self.domains:
+            dot = host.find(u'.')
+            while dot != -1:
+                if host[dot:] in self.domains:
+                    for domain_allowed in self.domains[host[dot:]].itervalues():
+                        allowed &= domain_allowed
+                    matched = True
+                dot = host.find(u'.', dot + 1)
+        if self._dirty:
+            self._compile()
+        if self._matchers:
+            hostmask = u'{0}!{1}@{2}'.format(nick, user, host)
+            for mask_allowed, match in self._matchers.iteritems():
+                if match(hostmask):
+                    allowed &= mask_allowed
+                    matched = True
+        if not matched:
+            allowed = self.nicks.get(u'*', ALL_EVENTS)
+        return allowed
+
+
 log = create_logger(__name__)
 
 
@@ -43,6 +255,74 @@ class HandlerError(Exception):
     pass
 
 
+def blocking(method):
+    """
+    Decorator that marks a handler method as blocking.
+
+    When the bot runs with synchronous dispatch enabled (see the ``sync_dispatch``
+    setting of :class:`fatbotslim.irc.bot.IRC`), blocking methods are run in the
+    bot's greenlets pool instead of being called inline in the event loop.
+    Use it for methods that perform I/O or take a noticeable amount of time::
+
+        class TitleHandler(CommandHandler):
+            triggers = {
+                'title': [EVT_PUBLIC],
+            }
+
+            @blocking
+            def title(self, msg):
+                page = urllib2.urlopen(msg.args[1]).read()
+                ...
+
+    :param method: handler method to mark.
+    :type method: function
+    :return: the marked method.
+    :rtype: function
+    """
+    method.blocking = True
+    return method
+
+
+def offload(function):
+    """
+    Decorator that runs `function` in a worker process (see :mod:`fatbotslim.offload`)
+    before calling the decorated handler method, so that CPU-heavy work doesn't
+    block the bot.
+
+    `function` must be defined at the top level of a module, it is called with
+    a copy of the :class:`fatbotslim.irc.bot.Message` and its result is passed
+    to the decorated method as second argument. Decorated methods are blocking
+    (see :func:`fatbotslim.handlers.blocking`)::
+
+        def count_words(msg):
+            return len(msg.args)
+
+        class WordsCounter(BaseHandler):
+            commands = {
+                PRIVMSG: 'count'
+            }
+
+            @offload(count_words)
+            def count(self, msg, result):
+                log.info('{0} words'.format(result))
+
+    :param function: function to run in a worker process.
+    :type function: callable
+    :return: method decorator.
+    :rtype: function
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, msg):
+            return method(self, msg, offload_pool.run(function, msg))
+
+        wrapper.blocking = True
+        return wrapper
+
+    return decorator
+
+
 class BaseHandler(object):
     """
     The base of every handler.
@@ -52,8 +332,16 @@ class BaseHandler(object):
 
     Mapped methods take 1 argument, the :class:`fatbotslim.irc.bot.Message` object
     that triggered the event.
+
+    If the handler's :attr:`blocking` attribute is set to ``True``, all its methods
+    are considered blocking (see :func:`fatbotslim.handlers.blocking`).
+
+    The :attr:`max_concurrency` attribute limits the amount of messages the handler
+    processes at the same time, further messages wait for their turn.
     """
     commands = {}
+    blocking = False
+    max_concurrency = None
 
     def __init__(self, irc):
         self.irc = irc
@@ -70,6 +358,18 @@ class BaseHandler(object):
         method = getattr(self, self.commands[msg.command])
         method(msg)
 
+    def is_blocking(self, method_name):
+        """
+        Tells whether the given method has to be run in the greenlets pool
+        when synchronous dispatch is enabled.
+
+        :param method_name: name of the method to check.
+        :type method_name: str
+        :return: `True` if the method is blocking.
+        :rtype: bool
+        """
+        return self.blocking or getattr(getattr(self, method_name), 'blocking', False)
+
 
 class CTCPHandler(BaseHandler):
     """
@@ -112,7 +412,7 @@ class PingHandler(BaseHandler):
     }
 
     def ping(self, msg):
-        self.irc.cmd(u'PONG', u' '.join(msg.args))
+        self.irc.cmd(u'PONG', u' '.join(msg.args), priority=True)
 
 
 class UnknownCodeHandler(BaseHandler):
@@ -175,18 +475,46 @@ class CommandHandler(BaseHandler):
                 if event not in (EVT_PUBLIC, EVT_PRIVATE, EVT_NOTICE):
                     raise HandlerError('Unknown event type: %s' % event)
 
+    def is_blocking(self, method_name):
+        """
+        Same as :meth:`fatbotslim.handlers.BaseHandler.is_blocking`, except that
+        the trigger dispatcher is blocking if any of the triggers methods is.
+        """
+        if method_name == '_dispatch_trigger':
+            return self.blocking or any(
+                getattr(getattr(self, trigger), 'blocking', False)
+                for trigger in self.triggers
+            )
+        return super(CommandHandler, self).is_blocking(method_name)
+
     def _dispatch_trigger(self, msg):
         """
         Dispatches the message to the corresponding method.
+
+        When the handler is registered on a bot, messages are routed directly to
+        :meth:`_run_trigger` by the bot's :class:`fatbotslim.handlers.TriggerRouter`,
+        unless this method is overridden.
         """
         if not msg.args[0].startswith(self.trigger_char):
             return
         split_args = msg.args[0].split()
         trigger = split_args[0].lstrip(self.trigger_char)
+        if trigger in self.triggers:
+            self._run_trigger(trigger, msg)
+
+    def _run_trigger(self, trigger, msg):
+        """
+        Calls the method of a trigger, if it reacts to the message's event type.
+
+        :param trigger: trigger found in the message.
+        :type trigger: str
+        :param msg: message that contains the trigger.
+        :type msg: :class:`fatbotslim.irc.bot.Message`
+        """
         if trigger in self.triggers:
             method = getattr(self, trigger)
             if msg.command == PRIVMSG:
-                if msg.dst == self.irc.nick:
+                if self.irc.is_me(msg.dst):
                     if EVT_PRIVATE in self.triggers[trigger]:
                         msg.event = EVT_PRIVATE
                         method(msg)
@@ -199,6 +527,111 @@ class CommandHandler(BaseHandler):
                 method(msg)
 
 
+class TriggerRouter(object):
+    """
+    Routes PRIVMSG and NOTICE messages to the triggers of all the command handlers
+    registered on a bot.
+
+    Triggers are indexed by the first character of their handler's :attr:`trigger_char`,
+    then by trigger name, so that a message's first word is looked up once for all
+    handlers, and only the matching trigger methods are called.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._unprefixed = []
+        self._routed = 0
+        self.positions = {}
+        self.trigger_chars = frozenset()
+
+    def __len__(self):
+        return self._routed
+
+    @staticmethod
+    def routable(handler):
+        """
+        Tells whether a handler's triggers can be routed, which is the case for
+        command handlers that don't override :meth:`CommandHandler._dispatch_trigger`.
+
+        :param handler: handler to check.
+        :type handler: :class:`fatbotslim.handlers.BaseHandler`
+        :rtype: bool
+        """
+        if not isinstance(handler, CommandHandler):
+            return False
+        dispatcher = handler.__class__._dispatch_trigger
+        return dispatcher.im_func is CommandHandler._dispatch_trigger.im_func
+
+    def build(self, handlers):
+        """
+        Indexes the triggers of the given handlers, and the position of every
+        handler (see :attr:`positions`).
+
+        :param handlers: handlers to index, in dispatch order.
+        :type handlers: list
+        """
+        routes = {}
+        routed = 0
+        for handler in handlers:
+            if not self.routable(handler):
+                continue
+            routed += 1
+            trigger_char = handler.trigger_char
+            groups = routes.setdefault(trigger_char[:1], [])
+            for group_char, table in groups:
+                if group_char == trigger_char:
+                    break
+            else:
+                table = {}
+                groups.append((trigger_char, table))
+            for trigger in handler.triggers:
+                table.setdefault(trigger, []).append((
+                    handler,
+                    [partial(handler._run_trigger, trigger)],
+                    handler.is_blocking(trigger)
+                ))
+        self._unprefixed = routes.pop('', [])
+        self._routes = routes
+        self._routed = routed
+        self.positions = dict((handler, position) for position, handler in enumerate(handlers))
+        self.trigger_chars = frozenset(routes)
+
+    def match(self, msg):
+        """
+        Finds the triggers contained in a message.
+
+        :param msg: PRIVMSG or NOTICE message.
+        :type msg: :class:`fatbotslim.irc.bot.Message`
+        :return: dispatch entries of the matching triggers, in handlers order.
+        :rtype: list
+        """
+        word = msg.args[0]
+        groups = self._routes.get(word[:1])
+        if self._unprefixed:
+            groups = (groups or []) + self._unprefixed
+        if not groups:
+            return []
+        matches = []
+        matched_groups = 0
+        for trigger_char, table in groups:
+            if word.startswith(trigger_char):
+                entries = table.get(word.lstrip(trigger_char))
+                if entries:
+                    matches.extend(entries)
+                    matched_groups += 1
+        if matched_groups > 1:
+            matches.sort(key=lambda entry: self.positions[entry[0]])
+        return matches
+
+    @property
+    def catch_all(self):
+        """
+        `True` if some handlers use an empty :attr:`trigger_char`, in which case
+        any message may contain a trigger.
+        """
+        return bool(self._unprefixed)
+
+
 class HelpHandler(CommandHandler):
     """
     Provides automatic help messages for :class:`fatbotslim.handlers.CommandHandler` commands.
@@ -237,12 +670,199 @@ class HelpHandler(CommandHandler):
             self.irc.notice(msg.src, message)
 
 
+class StatsHandler(CommandHandler):
+    """
+    Displays the handlers statistics recorded by the bot (see :meth:`fatbotslim.irc.bot.IRC.stats`),
+    the ``stats`` setting has to be enabled.
+    """
+    triggers = {
+        'stats': [EVT_PUBLIC, EVT_PRIVATE, EVT_NOTICE]
+    }
+    top = 5
+
+    def stats(self, msg):
+        """
+        stats [handler] - displays the slowest handlers, or the statistics of given handler
+        """
+        stats = self.irc.stats()
+        handlers = stats['handlers']
+        if len(msg.args) == 2:
+            if msg.args[1] not in handlers:
+                message = 'No statistics for handler: %s' % msg.args[1]
+            else:
+                methods = handlers[msg.args[1]]['methods']
+                message = '%s: %s' % (msg.args[1], ', '.join(
+                    '%s %d calls %d errors avg %.1fms max %.1fms' % (
+                        name, method['calls'], method['errors'],
+                        method['total_time'] * 1000 / method['calls'],
+                        method['max_time'] * 1000
+                    )
+                    for name, method in sorted(methods.iteritems())
+                ))
+        elif not handlers:
+            message = 'No statistics recorded (%d messages dropped)' % stats['shed']
+        else:
+            slowest = sorted(
+                handlers.iteritems(), key=lambda item: item[1]['total_time'], reverse=True
+            )[:self.top]
+            message = 'Slowest handlers: %s (%d messages dropped)' % (', '.join(
+                '%s %d calls %.1fms total' % (name, handler['calls'], handler['total_time'] * 1000)
+                for name, handler in slowest
+            ), stats['shed'])
+
+        if msg.event == EVT_PUBLIC:
+            self.irc.msg(msg.dst, message)
+        elif msg.event == EVT_PRIVATE:
+            self.irc.msg(msg.src.name, message)
+        elif msg.event == EVT_NOTICE:
+            self.irc.notice(msg.src.name, message)
+
+
 class RightsHandler(CommandHandler):
     """
     Provides rights management for :class:`fatbotslim.handlers.CommandHandler` commands.
+
+    Restrictions apply to a nickname, to a hostmask pattern (like ``*!*@trusted.host``), or
+    to everybody (``*``), in that order of precedence. When many hostmask patterns match an
+    user, only the events allowed by all of them are allowed.
+
+    Restrictions are kept in :attr:`commands_rights` with the names they were given, and are
+    compiled using the server's casemapping (again whenever it changes) into a table giving,
+    for each command and folded nickname, the events allowed as a bitmask (see :data:`EVENT_BITS`).
+    Changes update the compiled table incrementally, see :class:`RightsTable`.
+    Decisions are cached per user and command until the restrictions change.
     """
     notify = True
-    commands_rights = defaultdict(dict)
+    cache_size = 4096
+
+    def __init__(self, irc):
+        super(RightsHandler, self).__init__(irc)
+        self.triggers = dict(self.triggers)
+        self.commands_rights = defaultdict(dict)
+        self._rules = {}
+        self._names = {}
+        self._decisions = {}
+        self._writer = None
+        self._loaded = None
+        if irc.rights_storage is not None:
+            self._writer = BatchWriter(irc.rights_storage)
+            self._loaded = Event()
+            spawn(self._load)
+
+    def _load(self):
+        """
+        Loads the stored rights, reading them from the gevent threadpool.
+        """
+        try:
+            entries = get_hub().threadpool.apply(self.irc.rights_storage.load)
+            for command, user, events in entries:
+                self.commands_rights[command][user] = list(events)
+            added = False
+            for command in set(command for command, user, events in entries):
+                self._compile(command)
+                added = self._register(command) or added
+            if added:
+                self.irc.refresh_dispatch()
+            log.info('Loaded {0} rights entries'.format(len(entries)))
+        except Exception:
+            log.exception('Failed to load the stored rights')
+        finally:
+            self._loaded.set()
+
+    def _wait_loaded(self):
+        """
+        Waits for the stored rights to be loaded, so that they don't override newer changes.
+        """
+        if self._loaded is not None:
+            self._loaded.wait()
+
+    def flush(self):
+        """
+        Saves the pending rights changes, if a storage backend is used.
+        """
+        if self._writer is not None:
+            self._writer.flush()
+
+    def _register(self, command):
+        """
+        Makes :func:`handle_rights` called whenever `command` is triggered.
+
+        :param command: restricted command.
+        :type command: str
+        :return: whether a trigger was added, in which case the bot's dispatch
+            index must be refreshed.
+        :rtype: bool
+        """
+        if not hasattr(self, command):
+            setattr(self, command, lambda msg: self.handle_rights(msg))
+        if command in self.triggers:
+            return False
+        self.triggers[command] = [EVT_PUBLIC, EVT_PRIVATE, EVT_NOTICE]
+        return True
+
+    def _compile(self, command):
+        """
+        Compiles all the restrictions of `command` and invalidates the cached decisions.
+
+        :param command: command whose restrictions changed.
+        :type command: str
+        """
+        rights = self.commands_rights.get(command)
+        fold = self.irc.isupport.fold
+        if rights:
+            table = self._rules[command] = RightsTable()
+            self._names[command] = dict((fold(user), user) for user in rights)
+            for user, events in rights.iteritems():
+                table.add(fold(user), event_mask(events))
+        else:
+            self._rules.pop(command, None)
+            self._names.pop(command, None)
+        self._decisions.clear()
+
+    def recompile(self):
+        """
+        Compiles the restrictions of all the commands again, used when the server's
+        casemapping changes.
+        """
+        for command in self.commands_rights.keys():
+            self._compile(command)
+        self.clear_cache()
+
+    def clear_cache(self):
+        """
+        Forgets the cached decisions, used when the bot reconnects.
+        """
+        self._decisions.clear()
+
+    def allowed_events(self, command, nick, user=None, host=None):
+        """
+        Computes the events on which an user is allowed to use a command.
+
+        :param command: command the user wants to use.
+        :type command: str
+        :param nick: nickname of the user.
+        :type nick: unicode
+        :param user: username of the user, if known.
+        :type user: unicode or None
+        :param host: host of the user, if known.
+        :type host: unicode or None
+        :return: bitmask of the allowed events (see :data:`EVENT_BITS`).
+        :rtype: int
+        """
+        fold = self.irc.isupport.fold
+        nick = fold(nick)
+        key = (command, nick, user, host)
+        allowed = self._decisions.get(key)
+        if allowed is None:
+            table = self._rules.get(command)
+            if table is None:
+                allowed = ALL_EVENTS
+            else:
+                allowed = table.check(nick, fold(user or u''), fold(host or u''))
+            if len(self._decisions) >= self.cache_size:
+                self._decisions.clear()
+            self._decisions[key] = allowed
+        return allowed
 
     def set_restriction(self, command, user, event_types):
         """
@@ -250,16 +870,45 @@ class RightsHandler(CommandHandler):
 
         :param command: command on which the restriction should be set.
         :type command: str
-        :param user: username for which the restriction applies.
+        :param user: nickname or hostmask pattern for which the restriction applies.
         :type user: str
         :param event_types: types of events for which the command is allowed.
         :type event_types: list
         """
-        self.commands_rights[command][user.lower()] = event_types
-        if command not in self.triggers:
-            self.triggers[command] = [EVT_PUBLIC, EVT_PRIVATE, EVT_NOTICE]
-        if not hasattr(self, command):
-            setattr(self, command, lambda msg: self.handle_rights(msg))
+        self.set_restrictions(command, [user], event_types)
+
+    def set_restrictions(self, command, users, event_types):
+        """
+        Adds the same restriction for many users at once, like when importing a channel's
+        ban list.
+
+        :param command: command on which the restrictions should be set.
+        :type command: str
+        :param users: nicknames or hostmask patterns for which the restriction applies.
+        :type users: iterable
+        :param event_types: types of events for which the command is allowed.
+        :type event_types: list
+        """
+        self._wait_loaded()
+        rights = self.commands_rights[command]
+        names = self._names.setdefault(command, {})
+        table = self._rules.setdefault(command, RightsTable())
+        allowed = event_mask(event_types)
+        for user in users:
+            folded = self.irc.isupport.fold(user)
+            previous = names.get(folded)
+            if (previous is not None) and (previous != user):
+                rights.pop(previous, None)
+                if self._writer is not None:
+                    self._writer.put(command, previous, None)
+            names[folded] = user
+            rights[user] = list(event_types)
+            table.add(folded, allowed)
+            if self._writer is not None:
+                self._writer.put(command, user, list(rights[user]))
+        self._decisions.clear()
+        if self._register(command):
+            self.irc.refresh_dispatch()
 
     def del_restriction(self, command, user, event_types):
         """
@@ -267,19 +916,33 @@ class RightsHandler(CommandHandler):
 
         :param command: command on which the restriction should be removed.
         :type command: str
-        :param user: username for which restriction should be removed.
+        :param user: nickname or hostmask pattern for which restriction should be removed.
         :type user: str
         :param event_types: types of events that should be removed from restriction.
         :type event_types: list
         """
-        if user.lower() in self.commands_rights[command]:
+        self._wait_loaded()
+        rights = self.commands_rights.get(command, {})
+        folded = self.irc.isupport.fold(user)
+        user = self._names.get(command, {}).get(folded, user)
+        if user in rights:
             for event_type in event_types:
                 try:
-                    self.commands_rights[command][user.lower()].remove(event_type)
+                    rights[user].remove(event_type)
                 except ValueError:
                     pass
-            if not self.commands_rights[command][user.lower()]:
-                self.commands_rights[command].pop(user.lower())
+            table = self._rules[command]
+            if rights[user]:
+                table.add(folded, event_mask(rights[user]))
+            else:
+                rights.pop(user)
+                del self._names[command][folded]
+                table.remove(folded)
+                if not table:
+                    del self._rules[command]
+            if self._writer is not None:
+                self._writer.put(command, user, list(rights[user]) if user in rights else None)
+            self._decisions.clear()
 
     def handle_rights(self, msg):
         """
@@ -289,13 +952,10 @@ class RightsHandler(CommandHandler):
         :type msg: :class:`fatbotslim.irc.Message`
         """
         command = msg.args[0][1:]
-        if command in self.commands_rights:
-            if msg.src.name.lower() in self.commands_rights[command]:
-                if msg.event not in self.commands_rights[command][msg.src.name.lower()]:
-                    msg.propagate = False
-            elif '*' in self.commands_rights[command]:
-                if msg.event not in self.commands_rights[command]['*']:
-                    msg.propagate = False
+        if command in self._rules:
+            allowed = self.allowed_events(command, msg.src.name, msg.src.user, msg.src.host)
+            if not (allowed & EVENT_BITS[msg.event]):
+                msg.propagate = False
             if (not msg.propagate) and self.notify:
                 message = "You're not allowed to use the '%s' command" % command
                 if msg.event == EVT_PUBLIC:
@@ -16,9 +16,112 @@
 # along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
 #
 
+from collections import OrderedDict
+
 import chardet
 
 
+class Decoder(object):
+    """
+    Decodes strings received from the server.
+
+    Strings are first decoded using cheap candidate encodings (only UTF-8 by default).
+    If they all fail, the encoding previously detected for the string's source
+    (usually a nickname) is tried, and :func:`chardet.detect` is only called as a
+    last resort. Detected encodings are remembered in a bounded LRU cache.
+
+    The :attr:`hits` and :attr:`misses` counters respectively hold the amount of
+    strings decoded using a cached encoding, and the amount of detections performed.
+    """
+
+    def __init__(self, cache_size=1024, candidates=('utf-8',)):
+        """
+        :param cache_size: maximum amount of sources to remember the encoding of.
+        :type cache_size: int
+        :param candidates: encodings to try before the cached one.
+        :type candidates: tuple
+        """
+        self.cache_size = cache_size
+        self.candidates = candidates
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def source_key(line):
+        """
+        Extracts the sender's nickname (or server name) from a raw line,
+        to be used as cache key.
+
+        :param line: raw line received from the server.
+        :type line: str
+        :return: the sender, or `None` if the line has no prefix.
+        :rtype: str or None
+        """
+        start = 0
+        if line.startswith('@'):
+            start = line.find(' ') + 1
+        if line[start:start + 1] != ':':
+            return None
+        end = line.find(' ', start)
+        if end == -1:
+            return None
+        nick_end = line.find('!', start, end)
+        return line[start + 1:end if nick_end == -1 else nick_end]
+
+    def decode(self, s, key=None, errors='ignore'):
+        """
+        Decodes `s` and remembers the detected encoding for `key`.
+
+        :param s: string to decode.
+        :type s: str
+        :param key: source of the string, `None` disables caching.
+        :type key: str or None
+        :param errors: decoding error handling behaviour.
+        :type errors: str
+        :return: decoded string.
+        :rtype: unicode
+        """
+        for encoding in self.candidates:
+            try:
+                return s.decode(encoding)
+            except UnicodeDecodeError:
+                pass
+        cache = self._cache
+        if key is not None:
+            encoding = cache.pop(key, None)
+            if encoding is not None:
+                cache[key] = encoding
+                try:
+                    result = s.decode(encoding)
+                    self.hits += 1
+                    return result
+                except UnicodeDecodeError:
+                    pass
+        self.misses += 1
+        encoding = chardet.detect(s)['encoding'] or self.candidates[0]
+        try:
+            result = unicode(s, encoding=encoding, errors=errors)
+        except LookupError:
+            encoding = self.candidates[0]
+            result = unicode(s, encoding=encoding, errors=errors)
+        if key is not None:
+            cache[key] = encoding
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return result
+
+    def stats(self):
+        """
+        :return: cache statistics (``hits``, ``misses``, ``size``).
+        :rtype: dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache)}
+
+
+_decoder = Decoder(cache_size=0)
+
+
 def u(s, errors='ignore'):
     """
     Automatically detects given string's encoding and returns its unicode form.
@@ -32,8 +135,4 @@ def u(s, errors='ignore'):
     :return: decoded string
     :rtype: unicode
     """
-    try:
-        return s.decode('utf-8', errors=errors)
-    except UnicodeDecodeError:
-        encoding = chardet.detect(s)['encoding']
-        return unicode(s, encoding=encoding, errors=errors)
+    return _decoder.decode(s, errors=errors)
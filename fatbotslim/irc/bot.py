@@ -23,23 +23,53 @@
 This module contains IRC protocol related stuff.
 """
 
+import os
 import re
-from random import choice
+import signal
+import time
+from collections import deque
+from multiprocessing import Process, Queue
+from random import choice, uniform
+from threading import Thread
 
+import gevent
 from gevent import spawn, joinall, killall
-from gevent.pool import Group
+from gevent.event import Event
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Group, Pool
+try:
+    from gevent import signal_handler
+except ImportError:  # gevent < 1.5
+    from gevent import signal as signal_handler
 
-from fatbotslim.irc import u
+from fatbotslim import offload
+from fatbotslim.irc import u, Decoder
 from fatbotslim.irc.codes import *
+from fatbotslim.irc.flood import FloodControl
+from fatbotslim.irc.isupport import ISupport
+from fatbotslim.irc.state import State
+from fatbotslim.irc.text import MAX_LINE_SIZE, USERHOST_SIZE, encode, split
 from fatbotslim.irc.tcp import TCP, SSL
-from fatbotslim.handlers import CTCPHandler, PingHandler, UnknownCodeHandler, RightsHandler
-from fatbotslim.log import create_logger
+from fatbotslim.handlers import CTCPHandler, PingHandler, UnknownCodeHandler, RightsHandler, \
+    TriggerRouter
+from fatbotslim.log import create_logger, forward_logs, handle_forwarded_logs
 
 
+OVERLOAD_BLOCK = 'block'
+OVERLOAD_DROP_OLDEST = 'drop_oldest'
+OVERLOAD_DROP_NEW = 'drop_new'
+
 ctcp_re = re.compile(ur'\x01(.*?)\x01')
+tags_unescape_re = re.compile(ur'\\(.?)')
+tags_escapes = {u':': u';', u's': u' ', u'\\': u'\\', u'r': u'\r', u'n': u'\n'}
 log = create_logger(__name__)
 
 
+def _unescape_tag_value(match):
+    char = match.group(1)
+    return tags_escapes.get(char, char)
+
+
 class NullMessage(Exception):
     """
     Raised when an empty line is received from the server.
@@ -50,7 +80,12 @@ class NullMessage(Exception):
 class Message(object):
     """
     Holds informations about a line received from the server.
+
+    The line is only parsed when one of the message's fields is read for the first time.
+    Messages can be pickled, only the raw line and the dispatch state are serialized.
     """
+    __slots__ = ('_raw', '_parsed', '_raw_tags', '_tags', '_src', '_dst', '_command', '_args',
+                 '_erroneous', 'propagate', 'event')
 
     def __init__(self, data):
         """
@@ -58,23 +93,86 @@ class Message(object):
         :type data: unicode
         """
         self._raw = data
-        self.erroneous = False
+        self._parsed = False
+        self._tags = None
         self.propagate = True
-        try:
-            self.src, self.dst, self.command, self.args = Message.parse(data)
-        except IndexError:
-            self.src, self.dst, self.command, self.args = [None] * 4
-            self.erroneous = True
+        self.event = None
+
+    def __getstate__(self):
+        return self._raw, self.propagate, self.event
+
+    def __setstate__(self, state):
+        self._raw, self.propagate, self.event = state
+        self._parsed = False
+        self._tags = None
 
     def __str__(self):
         return u"<Message(src='{0}', dst='{1}', command='{2}', args={3})>".format(
             self.src.name, self.dst, self.command, self.args
         )
 
+    def _parse(self):
+        """
+        Parses the message's line and stores the extracted informations.
+        """
+        try:
+            (self._raw_tags, self._src, self._dst,
+             self._command, self._args) = Message._tokenize(self._raw)
+            self._erroneous = False
+        except (IndexError, ValueError):
+            self._raw_tags, self._src, self._dst, self._command, self._args = [None] * 5
+            self._erroneous = True
+        self._parsed = True
+
+    @property
+    def tags(self):
+        """
+        IRCv3 message tags, only parsed when first read.
+        """
+        if self._tags is None:
+            if not self._parsed:
+                self._parse()
+            if self._raw_tags is None:
+                self._tags = {}
+            else:
+                self._tags = Message.parse_tags(self._raw_tags)
+        return self._tags
+
+    @property
+    def src(self):
+        if not self._parsed:
+            self._parse()
+        return self._src
+
+    @property
+    def dst(self):
+        if not self._parsed:
+            self._parse()
+        return self._dst
+
+    @property
+    def command(self):
+        if not self._parsed:
+            self._parse()
+        return self._command
+
+    @property
+    def args(self):
+        if not self._parsed:
+            self._parse()
+        return self._args
+
+    @property
+    def erroneous(self):
+        if not self._parsed:
+            self._parse()
+        return self._erroneous
+
     @classmethod
     def parse(cls, data):
         """
         Extracts message informations from `data`.
+        IRCv3 message tags are skipped, see :meth:`parse_tags` to extract them.
 
         :param data: received line.
         :type data: unicode
@@ -82,30 +180,75 @@ class Message(object):
         :rtype: tuple(Source, str, str, list)
         :raise: :class:`fatbotslim.irc.NullMessage` if `data` is empty.
         """
+        return cls._tokenize(data)[1:]
+
+    @classmethod
+    def _tokenize(cls, data):
+        """
+        Splits `data` in a single pass, using the positions of the tags, prefix
+        and trailing parameter delimiters.
+
+        :param data: received line.
+        :type data: unicode
+        :return: raw tags (or `None`), source, destination, command, args.
+        :rtype: tuple(unicode, Source, str, str, list)
+        """
+        raw_tags = None
         src = u''
         dst = None
-        if data[0] == u':':
-            src, data = data[1:].split(u' ', 1)
-        if u' :' in data:
-            data, trailing = data.split(u' :', 1)
-            args = data.split()
-            args.extend(trailing.split())
+        start = 0
+        if data[0] == u'@':
+            start = data.index(u' ')
+            raw_tags = data[1:start]
+            while data[start] == u' ':
+                start += 1
+        if data[start] == u':':
+            end = data.index(u' ', start)
+            src = data[start + 1:end]
+            start = end + 1
+        trailing = data.find(u' :', start)
+        if trailing == -1:
+            args = data[start:].split()
         else:
-            args = data.split()
+            args = data[start:trailing].split()
+            args.extend(data[trailing + 2:].split())
         command = args.pop(0)
         if command in (PRIVMSG, NOTICE):
             dst = args.pop(0)
             if ctcp_re.match(args[0]):
                 args = args[0].strip(u'\x01').split()
                 command = u'CTCP_' + args.pop(0)
-        return Source(src), dst, command, args
+        return raw_tags, Source(src), dst, command, args
+
+    @classmethod
+    def parse_tags(cls, raw_tags):
+        """
+        Extracts IRCv3 message tags, unescaping their values.
+        Tags without a value are mapped to an empty string.
+
+        :param raw_tags: tags, as received (without the leading ``@``).
+        :type raw_tags: unicode
+        :return: tags names mapped to their values.
+        :rtype: dict
+        """
+        tags = {}
+        for tag in raw_tags.split(u';'):
+            if not tag:
+                continue
+            key, _, value = tag.partition(u'=')
+            if u'\\' in value:
+                value = tags_unescape_re.sub(_unescape_tag_value, value)
+            tags[key] = value
+        return tags
 
 
 class Source(object):
     """
     Holds informations about a message sender.
 
+    The prefix is only parsed when one of the source's fields is read for the first time.
     """
+    __slots__ = ('_raw', '_parsed', '_name', '_mode', '_user', '_host')
 
     def __init__(self, prefix):
         """
@@ -113,13 +256,51 @@ class Source(object):
         :type prefix: unicode
         """
         self._raw = prefix
-        self.name, self.mode, self.user, self.host = Source.parse(prefix)
+        self._parsed = False
+
+    def __getstate__(self):
+        return self._raw
+
+    def __setstate__(self, state):
+        self._raw = state
+        self._parsed = False
 
     def __str__(self):
         return u"<Source(nick='{0}', mode='{1}', user='{2}', host='{3}')>".format(
             self.name, self.mode, self.user, self.host
         )
 
+    def _parse(self):
+        """
+        Parses the source's prefix and stores the extracted informations.
+        """
+        self._name, self._mode, self._user, self._host = Source.parse(self._raw)
+        self._parsed = True
+
+    @property
+    def name(self):
+        if not self._parsed:
+            self._parse()
+        return self._name
+
+    @property
+    def mode(self):
+        if not self._parsed:
+            self._parse()
+        return self._mode
+
+    @property
+    def user(self):
+        if not self._parsed:
+            self._parse()
+        return self._user
+
+    @property
+    def host(self):
+        if not self._parsed:
+            self._parse()
+        return self._host
+
     @classmethod
     def parse(cls, prefix):
         """
@@ -169,6 +350,52 @@ class IRC(object):
         * nick: the bot's nickname (:class:`str`)
         * realname: the bot's real name (:class:`str`)
 
+        The following keys are optional:
+
+        * loglevel: minimal level for displayed logging messages (:class:`str`)
+        * sync_dispatch: run non-blocking handlers inline in the event loop, only
+          handlers marked as blocking (see :func:`fatbotslim.handlers.blocking`)
+          are run in the greenlets pool (:class:`bool`, defaults to `False`)
+        * recv_size: maximum amount of bytes read from the socket at once
+          (:class:`int`, defaults to `4096`)
+        * flood_control: enables outgoing flood control, either `True` to use the
+          default budgets, or a :class:`dict` of arguments for
+          :class:`fatbotslim.irc.flood.FloodControl` (``lines``, ``bytes``, ``period``)
+          (defaults to `None`, which disables it)
+        * decoder_cache_size: amount of senders for which the detected encoding is
+          remembered (:class:`int`, defaults to `1024`)
+        * encodings: encodings tried before detecting a line's encoding
+          (:class:`tuple`, defaults to ``('utf-8',)``)
+        * pool_size: maximum amount of greenlets running handlers at once
+          (:class:`int`, defaults to `None`, which means no limit)
+        * overload_policy: what to do with received messages when the pool is full,
+          one of :obj:`OVERLOAD_BLOCK` (wait for a free greenlet before reading the
+          next message), :obj:`OVERLOAD_DROP_OLDEST` (queue messages, dropping the
+          oldest ones when the queue is full) or :obj:`OVERLOAD_DROP_NEW` (drop the
+          received messages) (:class:`str`, defaults to :obj:`OVERLOAD_BLOCK`)
+        * backlog_size: maximum amount of messages queued with the
+          :obj:`OVERLOAD_DROP_OLDEST` policy (:class:`int`, defaults to `100`)
+        * stats: record handlers calls statistics, see :meth:`stats`
+          (:class:`bool`, defaults to `False`)
+        * reconnect: automatically reconnect when the connection is lost
+          (:class:`bool`, defaults to `True`)
+        * reconnect_delay: base delay before reconnecting, doubled after each failed
+          attempt (:class:`float`, defaults to `5`)
+        * reconnect_max_delay: maximum delay before reconnecting
+          (:class:`float`, defaults to `300`)
+        * rights_storage: backend persisting the rights, see :mod:`fatbotslim.storage`
+          (:class:`fatbotslim.storage.Storage`, defaults to `None`)
+        * track_state: keep track of the channels members, see :class:`fatbotslim.irc.state.State`
+          (:class:`bool`, defaults to `True`)
+        * timeout: socket timeout, in seconds (:class:`int`, defaults to `300`)
+        * ping_interval: delay between the PINGs sent to measure the lag, `None`
+          disables lag measurement (:class:`float`, defaults to `30`)
+        * lag_threshold: the connection is considered dead, and reset, when a PING
+          isn't answered within this delay (:class:`float`, defaults to `60`)
+        * offload_workers: amount of worker processes running the methods decorated
+          with :func:`fatbotslim.handlers.offload`, shared by all the bots of the
+          process (:class:`int`, defaults to the amount of CPUs)
+
         :param settings: bot configuration.
         :type settings: dict
         """
@@ -179,8 +406,53 @@ class IRC(object):
         self.nick = u(settings['nick'])
         self.realname = u(settings['realname'])
         self.handlers = []
-        self._pool = Group()
+        self._dispatch = {}
+        self._unknown_dispatch = []
+        self._router = TriggerRouter()
+        self._triggers_only = frozenset()
+        self.pool_size = settings.get('pool_size')
+        self._pool = Group() if self.pool_size is None else Pool(self.pool_size)
+        self.overload_policy = settings.get('overload_policy', OVERLOAD_BLOCK)
+        if self.overload_policy not in (OVERLOAD_BLOCK, OVERLOAD_DROP_OLDEST, OVERLOAD_DROP_NEW):
+            raise ValueError('Unknown overload policy: %s' % self.overload_policy)
+        self._backlog = deque(maxlen=settings.get('backlog_size', 100))
+        self._backlog_ready = Event()
+        self._backlog_greenlet = None
+        self.shed_count = 0
+        self._limits = {}
+        self._stats = {} if settings.get('stats', False) else None
+        self.reconnect = settings.get('reconnect', True)
+        self.reconnect_delay = settings.get('reconnect_delay', 5)
+        self.reconnect_max_delay = settings.get('reconnect_max_delay', 300)
+        self._reconnect_attempts = 0
+        self._quitting = False
+        self.timeout = settings.get('timeout', 300)
+        self.ping_interval = settings.get('ping_interval', 30)
+        self.lag_threshold = settings.get('lag_threshold', 60)
+        self.lag = None
+        self._prefix_size = None
+        self.isupport = ISupport()
+        self.state = State(self.isupport.fold) if settings.get('track_state', True) else None
+        self._lags = deque(maxlen=10)
+        self._ping_token = None
+        self._ping_sent = None
+        if 'offload_workers' in settings:
+            offload.configure(settings['offload_workers'])
         self.rights = None
+        self.rights_storage = settings.get('rights_storage')
+        self.sync_dispatch = settings.get('sync_dispatch', False)
+        self.recv_size = settings.get('recv_size', 4096)
+        self.decoder = Decoder(
+            settings.get('decoder_cache_size', 1024),
+            settings.get('encodings', ('utf-8',))
+        )
+        self.flood_control = None
+        self._flood_greenlet = None
+        flood_settings = settings.get('flood_control')
+        if flood_settings:
+            if flood_settings is True:
+                flood_settings = {}
+            self.flood_control = FloodControl(self._write, **flood_settings)
         log.setLevel(settings.get('loglevel', 'INFO'))
         for handler in self.default_handlers:
             self.add_handler(handler)
@@ -193,52 +465,332 @@ class IRC(object):
         :rtype: :class:`fatbotslim.irc.tcp.TCP` or :class:`fatbotslim.irc.tcp.SSL`
         """
         transport = SSL if self.ssl else TCP
-        return transport(self.server, self.port)
+        return transport(self.server, self.port, timeout=self.timeout, recv_size=self.recv_size)
 
     def _connect(self):
         """
         Connects the bot to the server and identifies itself.
+
+        :return: the greenlet running the connection, it ends when the connection is lost.
+        :rtype: :class:`gevent.Greenlet`
         """
         self.conn = self._create_connection()
-        spawn(self.conn.connect)
+        casemapping = self.isupport.casemapping
+        self.isupport.clear()
+        if self.rights is not None:
+            if self.isupport.casemapping != casemapping:
+                self.rights.recompile()
+            else:
+                self.rights.clear_cache()
+        if self.state is not None:
+            self.state.clear()
+        job = spawn(self._serve, self.conn)
+        if self.flood_control is not None:
+            self.flood_control.clear()
+        if (self.flood_control is not None) and (self._flood_greenlet is None):
+            self._flood_greenlet = spawn(self.flood_control.run)
+        if (self.pool_size is not None) and (self.overload_policy == OVERLOAD_DROP_OLDEST) \
+                and (self._backlog_greenlet is None):
+            self._backlog_greenlet = spawn(self._backlog_loop)
         self.set_nick(self.nick)
         self.cmd(u'USER', u'{0} 3 * {1}'.format(self.nick, self.realname))
+        return job
+
+    def _serve(self, conn):
+        """
+        Runs a connection until it is lost.
+
+        :param conn: connection to run.
+        :type conn: :class:`fatbotslim.irc.tcp.TCP`
+        """
+        try:
+            conn.connect()
+        except Exception as e:
+            log.error('Connection to {0}:{1} failed: {2}'.format(self.server, self.port, e))
+
+    def _next_reconnect_delay(self):
+        """
+        Computes the delay before the next connection attempt, using exponential
+        backoff with jitter, so that many bots don't reconnect at the same time.
+
+        :return: delay in seconds.
+        :rtype: float
+        """
+        delay = min(
+            self.reconnect_max_delay,
+            self.reconnect_delay * (2 ** self._reconnect_attempts)
+        )
+        self._reconnect_attempts += 1
+        return uniform(delay / 2.0, delay)
 
-    def _send(self, command):
+    def _send(self, command, target=None, priority=False):
         """
         Sends a raw line to the server.
+        If flood control is enabled, the line goes through it first.
 
         :param command: line to send.
-        :type command: unicode
+        :type command: unicode or str
+        :param target: user or channel the line is addressed to, if any.
+        :type target: unicode or None
+        :param priority: bypass the flood control queues.
+        :type priority: bool
+        """
+        if isinstance(command, unicode):
+            command = command.encode('utf-8')
+        if self.flood_control is None:
+            self._write(command)
+        else:
+            self.flood_control.put(command, target, priority)
+
+    def _write(self, command):
+        """
+        Puts a line in the connection's output queue.
+
+        :param command: encoded line to send.
+        :type command: str
         """
-        command = command.encode('utf-8')
         log.debug('>> ' + command)
         self.conn.oqueue.put(command)
 
     def _event_loop(self):
         """
         The main event loop.
-        Data from the server is parsed here using :func:`_parse_msg`.
-        Parsed events are put in the object's event queue (`self.events`).
+        Data from the server is parsed here into :class:`fatbotslim.irc.bot.Message`
+        objects, which are then passed to the handlers using :func:`_handle`.
+
+        PRIVMSG and NOTICE messages that can't contain a trigger are dropped here
+        when only command handlers would receive them.
         """
         while True:
             orig_line = self.conn.iqueue.get()
             log.debug('<< ' + orig_line)
-            line = u(orig_line, errors='replace').strip()
-            err_msg = False
-            try:
-                message = Message(line)
-            except ValueError:
-                err_msg = True
-            if err_msg or message.erroneous:
+            line = self.decoder.decode(
+                orig_line, Decoder.source_key(orig_line), errors='replace'
+            ).strip()
+            message = Message(line)
+            if message.erroneous:
                 log.error("Received a line that can't be parsed: \"%s\"" % orig_line)
                 continue
+            if self.state is not None:
+                try:
+                    self.state.update(message)
+                except Exception:
+                    log.exception("Error while tracking state from: \"%s\"" % orig_line)
             if message.command == ERR_NICKNAMEINUSE:
                 self.set_nick(IRC.randomize_nick(self.nick))
             elif message.command == RPL_CONNECTED:
+                self._reconnect_attempts = 0
                 for channel in self.channels:
                     self.join(channel)
-            self._handle(message)
+            elif message.command == PONG:
+                self._measure_lag(message)
+            elif message.command == RPL_ISUPPORT:
+                self._update_isupport(message.args[1:])
+            elif (message.command == JOIN) and self.is_me(message.src.name):
+                self._prefix_size = len(message.src.name.encode('utf-8')) + \
+                    len(message.src.user or u'') + len(message.src.host or u'') + 2
+            elif message.command in self._triggers_only:
+                if message.args[0][:1] not in self._router.trigger_chars:
+                    continue
+            self._admit(message)
+
+    def _lag_loop(self):
+        """
+        Sends a PING every :attr:`ping_interval` seconds to measure the lag, and
+        closes the connection if a PING isn't answered within :attr:`lag_threshold`
+        seconds, so that dead connections are detected quickly.
+        """
+        self._ping_token = None
+        self._ping_sent = None
+        last_ping = time.time()
+        while True:
+            gevent.sleep(min(1, self.ping_interval))
+            now = time.time()
+            if self._ping_sent is not None:
+                if now - self._ping_sent > self.lag_threshold:
+                    log.warning('No answer to PING for {0:.0f}s, resetting the connection'.format(
+                        now - self._ping_sent
+                    ))
+                    self.conn.disconnect()
+                    return
+            elif now - last_ping >= self.ping_interval:
+                last_ping = now
+                self._ping_token = u'LAG{0}'.format(int(now * 1000))
+                self._ping_sent = now
+                self.cmd(u'PING', u':{0}'.format(self._ping_token), priority=True)
+
+    def _measure_lag(self, msg):
+        """
+        Updates the lag measurements if `msg` answers the last PING sent by :func:`_lag_loop`.
+
+        :param msg: PONG message.
+        :type msg: :class:`fatbotslim.irc.Message`
+        """
+        if (self._ping_sent is not None) and (self._ping_token in msg.args):
+            self.lag = time.time() - self._ping_sent
+            self._lags.append(self.lag)
+            self._ping_sent = None
+
+    @property
+    def average_lag(self):
+        """
+        Average of the last lag measurements, in seconds (`None` if there is none).
+        """
+        if not self._lags:
+            return None
+        return sum(self._lags) / len(self._lags)
+
+    def _admit(self, msg):
+        """
+        Passes a message to :func:`_handle`, applying the overload policy
+        if the greenlets pool is bounded. PINGs are never dropped, and are handled
+        directly in the event loop so that a full pool can't delay the PONG.
+
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        """
+        if self.pool_size is None:
+            self._handle(msg)
+        elif msg.command == PING:
+            entries = self._entries(msg)
+            if entries:
+                self._run_entries(msg, entries)
+        elif self.overload_policy == OVERLOAD_BLOCK:
+            self._pool.wait_available()
+            self._handle(msg)
+        elif self.overload_policy == OVERLOAD_DROP_NEW:
+            if self._pool.full():
+                self.shed_count += 1
+                log.debug('Pool is full, dropped %s message', msg.command)
+            else:
+                self._handle(msg)
+        elif self._backlog or self._pool.full():
+            if len(self._backlog) == self._backlog.maxlen:
+                self.shed_count += 1
+                log.debug('Backlog is full, dropped %s message', self._backlog[0].command)
+            self._backlog.append(msg)
+            self._backlog_ready.set()
+        else:
+            self._handle(msg)
+
+    def _backlog_loop(self):
+        """
+        Passes the messages queued by the :obj:`OVERLOAD_DROP_OLDEST` policy
+        to :func:`_handle` as soon as the pool has room for them.
+        """
+        while True:
+            if not self._backlog:
+                self._backlog_ready.clear()
+                self._backlog_ready.wait()
+                continue
+            self._pool.wait_available()
+            if self._backlog:
+                self._handle(self._backlog.popleft())
+
+    def refresh_dispatch(self):
+        """
+        Builds the command-to-handler dispatch index from the registered handlers.
+
+        Each IRC command is mapped to an ordered list of ``(handler, methods, blocking)``
+        tuples, so that a message is only passed to the handlers that registered
+        for its command, in the same order as :attr:`handlers`.
+        Handlers registered for :obj:`fatbotslim.irc.codes.UNKNOWN_CODE` are also
+        added to the entries of every command that is not listed in
+        :obj:`fatbotslim.irc.codes.ALL_CODES`.
+
+        Triggers of command handlers are indexed separately by a
+        :class:`fatbotslim.handlers.TriggerRouter`, so that PRIVMSG and NOTICE messages
+        only reach the trigger methods they match.
+
+        It must be called whenever :attr:`handlers`, or the commands or triggers
+        of a registered handler, are modified.
+        """
+        keys = set()
+        for handler in self.handlers:
+            keys.update(
+                command for command in handler.commands
+                if command != UNKNOWN_CODE
+            )
+        dispatch = {}
+        for key in keys:
+            unknown = key not in ALL_CODES
+            entries = []
+            for handler in self.handlers:
+                routed = TriggerRouter.routable(handler)
+                method_names = []
+                for command, method_name in handler.commands.iteritems():
+                    if routed and (method_name == '_dispatch_trigger'):
+                        continue
+                    if command == UNKNOWN_CODE:
+                        matches = unknown
+                    else:
+                        matches = (command == key)
+                    if matches:
+                        method_names.append(method_name)
+                if method_names:
+                    entries.append(self._make_entry(handler, method_names))
+            dispatch[key] = entries
+        self._dispatch = dispatch
+        self._unknown_dispatch = [
+            self._make_entry(handler, [handler.commands[UNKNOWN_CODE]])
+            for handler in self.handlers
+            if UNKNOWN_CODE in handler.commands
+        ]
+        self._router.build(self.handlers)
+        self._limits = dict(
+            (handler, self._limits.get(handler) or BoundedSemaphore(handler.max_concurrency))
+            for handler in self.handlers
+            if handler.max_concurrency
+        )
+        if self._router.catch_all:
+            self._triggers_only = frozenset()
+        else:
+            self._triggers_only = frozenset(
+                command for command in (PRIVMSG, NOTICE)
+                if not self._dispatch.get(command)
+            )
+
+    @staticmethod
+    def _make_entry(handler, method_names):
+        """
+        Creates a dispatch index entry.
+
+        :param handler: handler the entry belongs to.
+        :type handler: :class:`fatbotslim.handlers.BaseHandler`
+        :param method_names: names of the handler methods to call.
+        :type method_names: list
+        :return: the dispatch entry.
+        :rtype: tuple(BaseHandler, list, bool)
+        """
+        methods = [getattr(handler, name) for name in method_names]
+        blocking = any(handler.is_blocking(name) for name in method_names)
+        return handler, methods, blocking
+
+    def _entries(self, msg):
+        """
+        Finds the dispatch entries of the handlers a message should be passed to.
+
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        :return: the matching dispatch entries, in the order of :attr:`handlers`.
+        :rtype: list
+        """
+        command = msg.command
+        entries = self._dispatch.get(command)
+        if entries is None:
+            if command in ALL_CODES:
+                entries = []
+            else:
+                entries = self._unknown_dispatch
+        if self._router and (command in (PRIVMSG, NOTICE)):
+            triggered = self._router.match(msg)
+            if triggered:
+                if entries:
+                    positions = self._router.positions
+                    entries = sorted(entries + triggered, key=lambda entry: positions[entry[0]])
+                else:
+                    entries = triggered
+        return entries
 
     def _handle(self, msg):
         """
@@ -247,33 +799,176 @@ class IRC(object):
         :param msg: received message
         :type msg: :class:`fatbotslim.irc.Message`
         """
+        entries = self._entries(msg)
+        if not entries:
+            return
+        if self.sync_dispatch:
+            self._dispatch_inline(msg, entries)
+        else:
+            self._dispatch_chained(msg, entries)
 
-        def handler_yielder():
-            for handler in self.handlers:
-                yield handler
+    def _dispatch_chained(self, msg, entries):
+        """
+        Runs each handler in its own greenlet, the next handler being spawned
+        once the previous one has finished.
+
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        :param entries: dispatch entries matching the message.
+        :type entries: list
+        """
 
         def handler_callback(_):
             if msg.propagate:
                 try:
-                    h = hyielder.next()
-                    g = self._pool.spawn(handler_runner, h)
+                    handler, methods, _ = entries_iter.next()
+                    g = self._pool.spawn(self._run_methods, msg, handler, methods)
                     g.link(handler_callback)
                 except StopIteration:
                     pass
 
-        def handler_runner(h):
-            for command in h.commands:
-                if command == msg.command:
-                    method = getattr(h, h.commands[command])
+        entries_iter = iter(entries)
+        first_handler, first_methods, _ = entries_iter.next()
+        g = self._pool.spawn(self._run_methods, msg, first_handler, first_methods)
+        g.link(handler_callback)
+
+    def _dispatch_inline(self, msg, entries):
+        """
+        Runs non-blocking handlers directly in the event loop.
+        Once a blocking handler is reached, it and the remaining handlers
+        are run in a single greenlet from the pool.
+
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        :param entries: dispatch entries matching the message.
+        :type entries: list
+        """
+        for position, (handler, methods, blocking) in enumerate(entries):
+            if position and not msg.propagate:
+                return
+            if blocking:
+                self._pool.spawn(self._run_entries, msg, entries[position:])
+                return
+            self._run_methods(msg, handler, methods)
+
+    def _run_entries(self, msg, entries):
+        """
+        Runs the given dispatch entries sequentially, stopping as soon as
+        the message should not be propagated anymore.
+
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        :param entries: dispatch entries to run.
+        :type entries: list
+        """
+        for position, (handler, methods, _) in enumerate(entries):
+            if position and not msg.propagate:
+                return
+            self._run_methods(msg, handler, methods)
+
+    def _run_methods(self, msg, handler, methods):
+        """
+        Calls a handler's methods, errors are logged so that they don't
+        interrupt the dispatch.
+        If the handler's concurrency is limited, waits until it can be run.
+
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        :param handler: handler the methods belong to.
+        :type handler: :class:`fatbotslim.handlers.BaseHandler`
+        :param methods: methods to call.
+        :type methods: list
+        """
+        limit = self._limits.get(handler)
+        if limit is not None:
+            limit.acquire()
+        try:
+            for method in methods:
+                if self._stats is not None:
+                    self._run_timed(msg, handler, method)
+                    continue
+                try:
                     method(msg)
+                except Exception:
+                    log.exception("Error in handler {0}".format(handler.__class__.__name__))
+        finally:
+            if limit is not None:
+                limit.release()
+
+    def _run_timed(self, msg, handler, method):
+        """
+        Calls a handler's method and records its statistics.
 
-        hyielder = handler_yielder()
+        :param msg: received message
+        :type msg: :class:`fatbotslim.irc.Message`
+        :param handler: handler the method belongs to.
+        :type handler: :class:`fatbotslim.handlers.BaseHandler`
+        :param method: method to call.
+        :type method: callable
+        """
+        failed = False
+        start = time.time()
         try:
-            next_handler = hyielder.next()
-            g = self._pool.spawn(handler_runner, next_handler)
-            g.link(handler_callback)
-        except StopIteration:
-            pass
+            method(msg)
+        except Exception:
+            failed = True
+            log.exception("Error in handler {0}".format(handler.__class__.__name__))
+        elapsed = time.time() - start
+        key = (handler.__class__.__name__, IRC._method_name(method))
+        record = self._stats.get(key)
+        if record is None:
+            record = self._stats[key] = [0, 0, 0.0, 0.0]  # calls, errors, total, max
+        record[0] += 1
+        if failed:
+            record[1] += 1
+        record[2] += elapsed
+        if elapsed > record[3]:
+            record[3] = elapsed
+
+    @staticmethod
+    def _method_name(method):
+        """
+        :param method: handler method, or trigger method bound by the trigger router.
+        :type method: callable
+        :return: the method's name.
+        :rtype: str
+        """
+        name = getattr(method, '__name__', None)
+        if name is None:  # functools.partial binding a trigger
+            name = method.args[0]
+        return name
+
+    def stats(self):
+        """
+        Returns statistics about the bot's activity.
+        Handlers statistics are only recorded when the ``stats`` setting is enabled,
+        they map each handler's class name to its amount of ``calls`` and ``errors``,
+        and its cumulative (``total_time``) and maximal (``max_time``) call durations
+        in seconds, both for the whole handler and for each of its ``methods``.
+
+        :return: handlers statistics, amount of dropped messages, decoder statistics and lag.
+        :rtype: dict
+        """
+        handlers = {}
+        for (handler_name, method_name), record in (self._stats or {}).iteritems():
+            calls, errors, total, maximum = record
+            handler_stats = handlers.setdefault(handler_name, {
+                'calls': 0, 'errors': 0, 'total_time': 0.0, 'max_time': 0.0, 'methods': {}
+            })
+            handler_stats['methods'][method_name] = {
+                'calls': calls, 'errors': errors, 'total_time': total, 'max_time': maximum
+            }
+            handler_stats['calls'] += calls
+            handler_stats['errors'] += errors
+            handler_stats['total_time'] += total
+            handler_stats['max_time'] = max(handler_stats['max_time'], maximum)
+        return {
+            'handlers': handlers,
+            'shed': self.shed_count,
+            'decoder': self.decoder.stats(),
+            'lag': self.lag,
+            'average_lag': self.average_lag,
+        }
 
     @classmethod
     def randomize_nick(cls, base, suffix_length=3):
@@ -297,6 +992,8 @@ class IRC(object):
         if self.rights is None:
             handler_instance = RightsHandler(self)
             self.handlers.insert(len(self.default_handlers), handler_instance)
+            self.rights = handler_instance
+            self.refresh_dispatch()
 
     def disable_rights(self):
         """
@@ -307,6 +1004,7 @@ class IRC(object):
                 self.handlers.remove(handler)
                 break
         self.rights = None
+        self.refresh_dispatch()
 
     def add_handler(self, handler, args=None, kwargs=None):
         """
@@ -326,8 +1024,9 @@ class IRC(object):
             self.rights = handler_instance
         if handler_instance not in self.handlers:
             self.handlers.append(handler_instance)
+            self.refresh_dispatch()
 
-    def cmd(self, command, args, prefix=None):
+    def cmd(self, command, args, prefix=None, target=None, priority=False):
         """
         Sends a command to the server.
 
@@ -337,11 +1036,15 @@ class IRC(object):
         :type args: basestring
         :param prefix: optional prefix to prepend to the command.
         :type prefix: str or None
+        :param target: user or channel the command is addressed to, used by flood control.
+        :type target: unicode or None
+        :param priority: bypass the flood control queues.
+        :type priority: bool
         """
         if prefix is None:
             prefix = u''
         raw_cmd = u'{0} {1} {2}'.format(prefix, command, args).strip()
-        self._send(raw_cmd)
+        self._send(raw_cmd, target, priority)
 
     def ctcp_reply(self, command, dst, message=None):
         """
@@ -358,39 +1061,158 @@ class IRC(object):
             raw_cmd = u'\x01{0}\x01'.format(command)
         else:
             raw_cmd = u'\x01{0} {1}\x01'.format(command, message)
-        self.notice(dst, raw_cmd)
+        self.cmd(u'NOTICE', u'{0} :{1}'.format(dst, raw_cmd), target=dst)
+
+    def _text_room(self, header):
+        """
+        Computes the room left for the text of a PRIVMSG or NOTICE line, once relayed
+        by the server (prefixed with the bot's ``nick!user@host``).
+
+        :param header: encoded beginning of the line (``<command> <target> :``).
+        :type header: str
+        :return: maximum size of the text, in bytes.
+        :rtype: int
+        """
+        prefix_size = self._prefix_size
+        if prefix_size is None:
+            prefix_size = len(self.nick.encode('utf-8')) + USERHOST_SIZE
+        return MAX_LINE_SIZE - len(header) - prefix_size - 4  # ':', ' ' and '\r\n'
+
+    def _send_text(self, command, target, text):
+        """
+        Sends a PRIVMSG or NOTICE, split into as many lines as needed for each of them
+        to fit in :data:`fatbotslim.irc.text.MAX_LINE_SIZE`.
+
+        :param command: IRC command to send (PRIVMSG or NOTICE).
+        :type command: unicode
+        :param target: user or channel to send to, :class:`str` is assumed to be UTF-8 encoded.
+        :type target: basestring
+        :param text: text to send (may contain many lines), :class:`str` is assumed to be UTF-8 encoded.
+        :type text: basestring
+        """
+        header = '{0} {1} :'.format(encode(command), encode(target))
+        for piece in split(encode(text), self._text_room(header)):
+            self._send(header + piece, target)
+
+    def max_targets(self, command):
+        """
+        Returns the maximum amount of targets the server accepts for `command`,
+        as advertised by the ``TARGMAX`` and ``MAXTARGETS`` tokens of RPL_ISUPPORT.
+
+        :param command: IRC command.
+        :type command: unicode
+        :return: the maximum amount of targets, `None` if there is no limit.
+        :rtype: int or None
+        """
+        isupport = self.isupport
+        if command in isupport.targmax:
+            return isupport.targmax[command]
+        if (command in (u'PRIVMSG', u'NOTICE')) and (isupport.maxtargets is not None):
+            return isupport.maxtargets
+        return 1
+
+    def _update_isupport(self, tokens):
+        """
+        Reads the features advertised in a RPL_ISUPPORT reply.
+
+        :param tokens: ``KEY[=VALUE]`` tokens sent by the server.
+        :type tokens: list
+        """
+        casemapping = self.isupport.casemapping
+        self.isupport.update(tokens)
+        if (self.isupport.casemapping != casemapping) and (self.rights is not None):
+            self.rights.recompile()
+        if self.state is not None:
+            self.state.set_param_modes(self.isupport.prefix, self.isupport.chanmodes)
+
+    def is_me(self, name):
+        """
+        Tells if `name` is the bot's nickname, according to the server's casemapping.
+
+        :param name: nickname.
+        :type name: unicode
+        :rtype: bool
+        """
+        return self.isupport.fold(name) == self.isupport.fold(self.nick)
+
+    def broadcast(self, targets, msg):
+        """
+        Sends a message to many users and/or channels, using as few lines as possible.
+        Targets are grouped as allowed by the server (see :func:`max_targets`), and
+        so that the message fits on a single line when possible.
+
+        :param targets: users and/or channels to send to, :class:`str` are assumed to be UTF-8 encoded.
+        :type targets: iterable
+        :param msg: message to send, :class:`str` is assumed to be UTF-8 encoded.
+        :type msg: basestring
+        """
+        text = encode(msg)
+        limit = self.max_targets(u'PRIVMSG')
+        room = self._text_room('PRIVMSG  :')
+        room -= min(len(text), room // 2)  # room left for the targets
+        group, size = [], 0
+        for target in targets:
+            target = encode(target)
+            if group and ((len(group) == limit) or (size + len(target) + 1 > room)):
+                self._send_text(u'PRIVMSG', ','.join(group), text)
+                group, size = [], 0
+            group.append(target)
+            size += len(target) + 1
+        if group:
+            self._send_text(u'PRIVMSG', ','.join(group), text)
 
     def msg(self, target, msg):
         """
         Sends a message to an user or channel.
+        Long messages are split into many lines.
 
         :param target: user or channel to send to.
         :type target: str
         :param msg: message to send.
         :type msg: str
         """
-        self.cmd(u'PRIVMSG', u'{0} :{1}'.format(target, msg))
+        self._send_text(u'PRIVMSG', target, msg)
 
     def notice(self, target, msg):
         """
         Sends a NOTICE to an user or channel.
+        Long messages are split into many lines.
 
         :param target: user or channel to send to.
         :type target: str
         :param msg: message to send.
         :type msg: basestring
         """
-        self.cmd(u'NOTICE', u'{0} :{1}'.format(target, msg))
+        self._send_text(u'NOTICE', target, msg)
 
     def join(self, channel):
         """
-        Make the bot join a channel.
+        Make the bot join a channel, it is joined again after a reconnection.
 
         :param channel: new channel to join.
         :type channel: str
         """
+        fold = self.isupport.fold
+        if not any(fold(joined) == fold(channel) for joined in self.channels):
+            self.channels.append(channel)
         self.cmd(u'JOIN', channel)
 
+    def part(self, channel, message=None):
+        """
+        Make the bot leave a channel.
+
+        :param channel: channel to leave.
+        :type channel: str
+        :param message: optional part message.
+        :type message: str
+        """
+        fold = self.isupport.fold
+        self.channels[:] = [joined for joined in self.channels if fold(joined) != fold(channel)]
+        if message is None:
+            self.cmd(u'PART', channel)
+        else:
+            self.cmd(u'PART', u'{0} :{1}'.format(channel, message))
+
     def set_nick(self, nick):
         """
         Changes the bot's nickname.
@@ -403,24 +1225,57 @@ class IRC(object):
     def disconnect(self):
         """
         Disconnects the bot from the server.
+        Pending rights changes are saved first.
         """
+        self._quitting = True
+        if self.rights is not None:
+            self.rights.flush()
         self.cmd(u'QUIT', u':{0}'.format(self.quit_msg))
 
     def run(self):
         """
         Connects the bot and starts the event loop.
+        If reconnection is enabled, the bot reconnects whenever the connection is
+        lost (unless :meth:`disconnect` was called) and joins its :attr:`channels` again.
         """
-        self._connect()
-        self._event_loop()
+        self._quitting = False
+        while True:
+            job = self._connect()
+            loops = [spawn(self._event_loop)]
+            if self.ping_interval:
+                loops.append(spawn(self._lag_loop))
+            try:
+                job.join()
+            finally:
+                killall(loops)
+            if self._quitting or not self.reconnect:
+                break
+            delay = self._next_reconnect_delay()
+            log.warning('Lost connection to {0}:{1}, reconnecting in {2:.1f}s'.format(
+                self.server, self.port, delay
+            ))
+            gevent.sleep(delay)
 
 
-def run_bots(bots):
+def run_bots(bots, processes=None, restart_delay=5):
     """
     Run many bots in parallel.
 
+    If `processes` is given, bots are sharded across as many worker processes,
+    each one running its bots in its own event loop. Worker processes that die
+    are restarted after `restart_delay` seconds, their logs are displayed by the
+    main process. On :exc:`KeyboardInterrupt`, all the bots are disconnected.
+
     :param bots: IRC bots to run.
     :type bots: list
+    :param processes: amount of worker processes, `None` runs the bots in the current process.
+    :type processes: int or None
+    :param restart_delay: time to wait before restarting a dead worker, in seconds.
+    :type restart_delay: float
     """
+    if processes:
+        _run_shards(bots, processes, restart_delay)
+        return
     greenlets = [spawn(bot.run) for bot in bots]
     try:
         joinall(greenlets)
@@ -429,3 +1284,78 @@ def run_bots(bots):
             bot.disconnect()
     finally:
         killall(greenlets)
+
+
+def _run_shard(bots, log_queue):
+    """
+    Entry point of a worker process started by :func:`run_bots`.
+    SIGTERM is turned into a :exc:`KeyboardInterrupt`, so that bots are cleanly disconnected.
+
+    :param bots: IRC bots to run.
+    :type bots: list
+    :param log_queue: queue to send the logs to.
+    :type log_queue: :class:`multiprocessing.Queue`
+    """
+    gevent.reinit()
+    forward_logs(log_queue)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal_handler(signal.SIGTERM, gevent.get_hub().parent.throw, KeyboardInterrupt)
+    run_bots(bots)
+    gevent.sleep(1)  # lets QUIT messages be sent
+
+
+def _run_shards(bots, processes, restart_delay):
+    """
+    Runs bots sharded across worker processes, and restarts the workers that die.
+
+    :param bots: IRC bots to run.
+    :type bots: list
+    :param processes: amount of worker processes.
+    :type processes: int
+    :param restart_delay: time to wait before restarting a dead worker, in seconds.
+    :type restart_delay: float
+    """
+    shards = [bots[index::processes] for index in range(processes)]
+    shards = [shard for shard in shards if shard]
+    log_queue = Queue()
+    listener = Thread(target=handle_forwarded_logs, args=(log_queue,))
+    listener.daemon = True
+    listener.start()
+
+    def start(index):
+        worker = Process(
+            target=_run_shard, args=(shards[index], log_queue), name='shard-{0}'.format(index)
+        )
+        worker.start()
+        return worker
+
+    workers = dict((index, start(index)) for index in range(len(shards)))
+    restarts = {}
+    try:
+        while True:
+            now = time.time()
+            for index, worker in workers.items():
+                if worker is None:
+                    if now >= restarts[index]:
+                        log.info('Restarting shard-{0}'.format(index))
+                        workers[index] = start(index)
+                elif not worker.is_alive():
+                    log.error('shard-{0} died (exit code {1}), restarting in {2}s'.format(
+                        index, worker.exitcode, restart_delay
+                    ))
+                    workers[index] = None
+                    restarts[index] = now + restart_delay
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        log.info('Disconnecting all shards...')
+    finally:
+        alive = [worker for worker in workers.itervalues() if worker is not None]
+        for worker in alive:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+        for worker in alive:
+            worker.join(10)
+            if worker.is_alive():
+                worker.terminate()
+        log_queue.put(None)
+        listener.join(1)
@@ -38,7 +38,8 @@ It also defines some custom codes:
 
 **CTCP_VERSION**, **CTCP_PING**, **CTCP_TIME**, **CTCP_SOURCE**: self-explanatory.
 
-**PING**, **PRIVMSG**, **NOTICE**, **JOIN**, **PART**: self-explanatory.
+**PING**, **PONG**, **PRIVMSG**, **NOTICE**, **JOIN**, **PART**, **MODE**, **KICK**, **QUIT**,
+**NICK**: self-explanatory.
 
 ---
 
@@ -52,7 +53,7 @@ There are also 2 special code sets:
 
 **ALL_CODES**: Matches any code if listed in the groups previously mentionned.
 
-**UNKNOWN_CODE**: Matches any code not listed in ``ALL_CODES``.
+**UNKNOWN_CODE**: Handlers registered for this code receive any code not listed in ``ALL_CODES``.
 """
 
 # Error replies.
@@ -372,35 +373,30 @@ CTCP = set([
 # Others:
 PRIVMSG = 'PRIVMSG'
 PING = 'PING'
+PONG = 'PONG'
 NOTICE = 'NOTICE'
 JOIN = 'JOIN'
 PART = 'PART'
 MODE = 'MODE'
 KICK = 'KICK'
 QUIT = 'QUIT'
+NICK = 'NICK'
 OTHERS = set([
     PRIVMSG,
     PING,
+    PONG,
     NOTICE,
     JOIN,
     PART,
     MODE,
     KICK,
     QUIT,
+    NICK,
 ])
 
 ALL_CODES = ERRORS | RESPONSES | RESERVED | CTCP | OTHERS
 
 
-class UnknownCode(object):
-    def __init__(self, known_codes):
-        self.known_codes = set(known_codes)
-
-    def __eq__(self, other):
-        return other not in self.known_codes
-
-    def __ne__(self, other):
-        return other in self.known_codes
-
-
-UNKNOWN_CODE = UnknownCode(ALL_CODES)
+# Routing category for the codes that are not listed in ALL_CODES, its value
+# can't collide with a real command since those never contain an underscore.
+UNKNOWN_CODE = 'UNKNOWN_CODE'
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+.. module:: fatbotslim.irc.flood
+
+.. moduleauthor:: Mathieu D. (MatToufoutu)
+
+This module contains the outgoing flood control scheduler.
+"""
+
+import time
+from collections import deque
+
+from gevent import sleep
+from gevent.event import Event
+
+
+class TokenBucket(object):
+    """
+    A token bucket, refilled continuously up to its capacity.
+    """
+
+    def __init__(self, capacity, period):
+        """
+        :param capacity: maximum amount of tokens in the bucket.
+        :type capacity: int
+        :param period: time needed to entirely refill an empty bucket, in seconds.
+        :type period: float
+        """
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self._last = time.time()
+
+    def refill(self, now):
+        """
+        Adds the tokens earned since the last refill.
+
+        :param now: current timestamp.
+        :type now: float
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def delay(self, amount):
+        """
+        Computes the time to wait before `amount` tokens are available.
+
+        :param amount: amount of tokens needed.
+        :type amount: float
+        :return: time to wait, in seconds.
+        :rtype: float
+        """
+        missing = min(amount, self.capacity) - self.tokens
+        if missing <= 0:
+            return 0
+        return missing / self.rate
+
+    def consume(self, amount):
+        """
+        Removes tokens from the bucket, the bucket can go into debt.
+
+        :param amount: amount of tokens to remove.
+        :type amount: float
+        """
+        self.tokens -= amount
+
+
+class FloodControl(object):
+    """
+    Schedules outgoing lines so that the server doesn't disconnect the bot
+    for excess flood.
+
+    Lines are sent as long as both a lines budget and a bytes budget allow it,
+    each budget being refilled over a period of time (token buckets).
+    Queued lines are grouped by target, and targets are served in a round-robin
+    fashion, so that a busy channel can't starve the others.
+
+    Priority lines (like PONG replies) skip the queues and are sent immediately,
+    their cost is still taken from the budgets.
+    """
+
+    def __init__(self, output, lines=5, bytes=2048, period=10.0):
+        """
+        :param output: function called with each line that should be sent.
+        :type output: callable
+        :param lines: maximum amount of lines to send per `period`.
+        :type lines: int
+        :param bytes: maximum amount of bytes to send per `period`.
+        :type bytes: int
+        :param period: duration of the budgets refill, in seconds.
+        :type period: float
+        """
+        self.output = output
+        self._lines = TokenBucket(lines, period)
+        self._bytes = TokenBucket(bytes, period)
+        self._pending = {}
+        self._targets = deque()
+        self._wakeup = Event()
+
+    def __len__(self):
+        return sum(len(lines) for lines in self._pending.itervalues())
+
+    def _delay(self, line):
+        """
+        Computes the time to wait before `line` can be sent.
+
+        :param line: line to send.
+        :type line: str
+        :return: time to wait, in seconds.
+        :rtype: float
+        """
+        now = time.time()
+        self._lines.refill(now)
+        self._bytes.refill(now)
+        return max(self._lines.delay(1), self._bytes.delay(len(line) + 2))
+
+    def _write(self, line):
+        """
+        Sends a line and takes its cost from the budgets.
+
+        :param line: line to send.
+        :type line: str
+        """
+        self._lines.consume(1)
+        self._bytes.consume(len(line) + 2)
+        self.output(line)
+
+    def put(self, line, target=None, priority=False):
+        """
+        Schedules a line to be sent.
+
+        :param line: line to send.
+        :type line: str
+        :param target: user or channel the line is addressed to, if any.
+        :type target: unicode or None
+        :param priority: send the line immediately.
+        :type priority: bool
+        """
+        if priority:
+            self._delay(line)  # refills the budgets before taking the line's cost
+            self._write(line)
+            return
+        if target not in self._pending:
+            self._pending[target] = deque()
+            self._targets.append(target)
+        self._pending[target].append(line)
+        self._wakeup.set()
+
+    def clear(self):
+        """
+        Drops all the queued lines.
+        """
+        self._pending.clear()
+        self._targets.clear()
+
+    def run(self):
+        """
+        Sends the queued lines forever, as fast as the budgets allow it.
+        """
+        while True:
+            if not self._targets:
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+            target = self._targets[0]
+            lines = self._pending[target]
+            wait = self._delay(lines[0])
+            if wait > 0:
+                sleep(wait)
+                continue
+            self._targets.popleft()
+            self._write(lines.popleft())
+            if lines:
+                self._targets.append(target)
+            else:
+                del self._pending[target]
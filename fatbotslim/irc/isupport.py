@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+.. module:: fatbotslim.irc.isupport
+
+.. moduleauthor:: Mathieu D. (MatToufoutu)
+
+This module contains the parser for the features advertised by the server
+in RPL_ISUPPORT (``005``) replies, and the case-mapping aware comparison of names.
+"""
+
+import re
+import string
+
+_upper = u'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_lower = u'abcdefghijklmnopqrstuvwxyz'
+
+#: Characters considered uppercase/lowercase equivalents by each supported casemapping.
+CASEMAPPINGS = {
+    'ascii': (_upper, _lower),
+    'rfc1459': (_upper + u'[]\\~', _lower + u'{}|^'),
+    'strict-rfc1459': (_upper + u'[]\\', _lower + u'{}|'),
+}
+
+escape_re = re.compile(r'\\x([0-9A-Fa-f]{2})')
+
+
+def _translate_tables(casemapping):
+    """
+    Builds the translate tables folding names according to `casemapping`.
+
+    :param casemapping: name of the casemapping, unknown ones fall back to ``rfc1459``.
+    :type casemapping: str
+    :return: the tables to use with :meth:`unicode.translate` and :meth:`str.translate`.
+    :rtype: tuple(dict, str)
+    """
+    upper, lower = CASEMAPPINGS.get(casemapping, CASEMAPPINGS['rfc1459'])
+    unicode_table = dict(zip(map(ord, upper), map(ord, lower)))
+    bytes_table = string.maketrans(upper.encode('ascii'), lower.encode('ascii'))
+    return unicode_table, bytes_table
+
+
+class ISupport(object):
+    """
+    Features advertised by the server, and the case-mapping aware :func:`fold` function.
+
+    Tokens are available as a mapping (``isupport['NETWORK']``), tokens without a value
+    are mapped to an empty string. Some tokens are also parsed into attributes:
+    :attr:`casemapping`, :attr:`chantypes`, :attr:`prefix`, :attr:`chanmodes`,
+    :attr:`targmax` and :attr:`maxtargets`.
+    """
+
+    def __init__(self, cache_size=4096):
+        """
+        :param cache_size: maximum amount of folded names to remember.
+        :type cache_size: int
+        """
+        self.cache_size = cache_size
+        self.tokens = {}
+        self._folded = {}
+        self.casemapping = None
+        self._refresh()
+
+    def __getitem__(self, name):
+        return self.tokens[name]
+
+    def __contains__(self, name):
+        return name in self.tokens
+
+    def get(self, name, default=None):
+        """
+        :param name: token name.
+        :type name: str
+        :param default: value returned if the server didn't advertise the token.
+        :return: the token's value.
+        :rtype: unicode
+        """
+        return self.tokens.get(name, default)
+
+    def clear(self):
+        """
+        Forgets all the advertised tokens, used when the connection is lost.
+        """
+        self.tokens.clear()
+        self._refresh()
+
+    def update(self, tokens):
+        """
+        Reads the tokens of a RPL_ISUPPORT reply.
+
+        :param tokens: parameters of the reply, following the bot's nickname.
+        :type tokens: list
+        """
+        for token in tokens:
+            name, _, value = token.partition(u'=')
+            if name.startswith(u'-'):
+                self.tokens.pop(name[1:], None)
+            elif name.isupper():  # skips the words of the trailing "are supported by this server"
+                self.tokens[name] = escape_re.sub(lambda m: unichr(int(m.group(1), 16)), value)
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Parses the tokens used by the library.
+        """
+        tokens = self.tokens
+        casemapping = tokens.get(u'CASEMAPPING') or 'rfc1459'
+        if casemapping != self.casemapping:
+            self.casemapping = casemapping
+            self._unicode_table, self._bytes_table = _translate_tables(casemapping)
+            self._folded.clear()
+        self.chantypes = tokens.get(u'CHANTYPES', u'#&')
+        self.prefix = tokens.get(u'PREFIX') or u'(qaohv)~&@%+'
+        self.chanmodes = tokens.get(u'CHANMODES') or u'beI,k,l,imnpst'
+        self.targmax = {}
+        for limit in tokens.get(u'TARGMAX', u'').split(u','):
+            command, _, count = limit.partition(u':')
+            if command:
+                self.targmax[command.upper()] = int(count) if count.isdigit() else None
+        maxtargets = tokens.get(u'MAXTARGETS', u'')
+        self.maxtargets = int(maxtargets) if maxtargets.isdigit() else None
+
+    def fold(self, name):
+        """
+        Folds the case of a nickname or channel name according to the server's casemapping,
+        so that names can be compared and used as dictionary keys.
+        Results are cached.
+
+        :param name: name to fold.
+        :type name: basestring
+        :return: the folded name.
+        :rtype: basestring
+        """
+        folded = self._folded.get(name)
+        if folded is None:
+            if len(self._folded) >= self.cache_size:
+                self._folded.clear()
+            if isinstance(name, unicode):
+                folded = name.translate(self._unicode_table)
+            else:
+                folded = name.translate(self._bytes_table)
+            self._folded[name] = folded
+        return folded
+
+    def equals(self, name1, name2):
+        """
+        :return: whether `name1` and `name2` are the same name according to the server's casemapping.
+        :rtype: bool
+        """
+        return self.fold(name1) == self.fold(name2)
+
+    def is_channel(self, name):
+        """
+        :return: whether `name` is a channel name.
+        :rtype: bool
+        """
+        return bool(name) and (name[0] in self.chantypes)
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+.. module:: fatbotslim.irc.state
+
+.. moduleauthor:: Mathieu D. (MatToufoutu)
+
+This module contains the tracker keeping the state of the channels the bot is on,
+and of the users it can see on them.
+"""
+
+from collections import OrderedDict
+
+from fatbotslim.irc.codes import JOIN, PART, KICK, QUIT, NICK, MODE, RPL_CONNECTED, RPL_NAMREPLY
+
+
+def _lower(s):
+    return s.lower()
+
+
+class User(object):
+    """
+    An user seen on at least one of the bot's channels.
+    """
+    __slots__ = ('key', 'nick', 'user', 'host', 'channels')
+
+    def __init__(self, key, nick):
+        """
+        :param key: folded nickname, used as key in the state indexes.
+        :type key: unicode
+        :param nick: nickname.
+        :type nick: unicode
+        """
+        self.key = key
+        self.nick = nick
+        self.user = None
+        self.host = None
+        self.channels = set()
+
+    def __repr__(self):
+        return u"<User(nick='{0}', channels={1})>".format(self.nick, len(self.channels))
+
+
+class Channel(object):
+    """
+    A channel the bot is on.
+    """
+    __slots__ = ('key', 'name', 'members')
+
+    def __init__(self, key, name):
+        """
+        :param key: folded channel name, used as key in the state indexes.
+        :type key: unicode
+        :param name: channel name.
+        :type name: unicode
+        """
+        self.key = key
+        self.name = name
+        self.members = {}
+
+    def __repr__(self):
+        return u"<Channel(name='{0}', members={1})>".format(self.name, len(self.members))
+
+
+class State(object):
+    """
+    Keeps track of the channels the bot is on, their members and their members' modes,
+    using the JOIN, PART, KICK, QUIT, NICK, MODE and RPL_NAMREPLY messages.
+
+    Two indexes are kept: :attr:`channels` maps folded channel names to :class:`Channel`
+    objects, whose ``members`` map folded nicknames to the member's prefixes (like ``@``),
+    and :attr:`users` maps folded nicknames to :class:`User` objects, whose ``channels``
+    hold the folded names of the channels they are on. A single key string is kept per user,
+    and is shared by all the channels the user is on.
+    """
+
+    def __init__(self, fold=None):
+        """
+        :param fold: function used to make case insensitive keys from nicknames and
+            channel names, defaults to :meth:`unicode.lower`.
+        :type fold: callable
+        """
+        self.fold = _lower if fold is None else fold
+        self.nick = None
+        self.channels = {}
+        self.users = {}
+        self.set_param_modes(u'(qaohv)~&@%+', u'beI,k,l,imnpst')
+        # handler and minimum amount of arguments of each tracked message
+        self._handlers = {
+            RPL_CONNECTED: (self._on_connected, 1),
+            RPL_NAMREPLY: (self._on_names, 3),
+            JOIN: (self._on_join, 1),
+            PART: (self._on_part, 1),
+            KICK: (self._on_kick, 2),
+            QUIT: (self._on_quit, 0),
+            NICK: (self._on_nick, 1),
+            MODE: (self._on_mode, 2),
+        }
+
+    def set_param_modes(self, prefix, chanmodes):
+        """
+        Sets the channel modes taking a parameter, from the ``PREFIX`` and ``CHANMODES``
+        tokens of RPL_ISUPPORT.
+
+        :param prefix: members modes and their prefixes, like ``(ov)@+``.
+        :type prefix: unicode
+        :param chanmodes: channel modes types, like ``beI,k,l,imnpst``.
+        :type chanmodes: unicode
+        """
+        modes, _, symbols = prefix[1:].partition(u')')
+        self.prefixes = OrderedDict(zip(modes, symbols))
+        types = chanmodes.split(u',')
+        self.param_modes = u''.join(types[:2])
+        self._set_only_modes = types[2] if len(types) > 2 else u''
+
+    def clear(self):
+        """
+        Forgets everything, used when the connection is lost.
+        """
+        self.nick = None
+        self.channels.clear()
+        self.users.clear()
+
+    def update(self, msg):
+        """
+        Updates the state using a message received from the server.
+        Messages missing arguments are ignored.
+
+        :param msg: received message.
+        :type msg: :class:`fatbotslim.irc.bot.Message`
+        """
+        handler = self._handlers.get(msg.command)
+        if (handler is not None) and (len(msg.args) >= handler[1]):
+            handler[0](msg)
+
+    def user(self, nick):
+        """
+        :param nick: nickname of the user.
+        :type nick: unicode
+        :return: the user, if the bot shares a channel with it.
+        :rtype: :class:`User` or None
+        """
+        return self.users.get(self.fold(nick))
+
+    def channel(self, name):
+        """
+        :param name: name of the channel.
+        :type name: unicode
+        :return: the channel, if the bot is on it.
+        :rtype: :class:`Channel` or None
+        """
+        return self.channels.get(self.fold(name))
+
+    def members(self, channel):
+        """
+        :param channel: name of the channel.
+        :type channel: unicode
+        :return: nicknames of the channel's members (empty if the bot isn't on the channel).
+        :rtype: list
+        """
+        chan = self.channels.get(self.fold(channel))
+        if chan is None:
+            return []
+        users = self.users
+        return [users[key].nick for key in chan.members]
+
+    def channels_of(self, nick):
+        """
+        :param nick: nickname of the user.
+        :type nick: unicode
+        :return: names of the bot's channels the user is on.
+        :rtype: list
+        """
+        user = self.users.get(self.fold(nick))
+        if user is None:
+            return []
+        channels = self.channels
+        return [channels[key].name for key in user.channels]
+
+    def prefix(self, nick, channel):
+        """
+        :param nick: nickname of the user.
+        :type nick: unicode
+        :param channel: name of the channel.
+        :type channel: unicode
+        :return: the user's prefixes on the channel (like ``@``), `None` if it isn't on it.
+        :rtype: unicode or None
+        """
+        chan = self.channels.get(self.fold(channel))
+        if chan is None:
+            return None
+        return chan.members.get(self.fold(nick))
+
+    def _is_me(self, key):
+        return (self.nick is not None) and (key == self.fold(self.nick))
+
+    def _add_member(self, chan, nick, prefixes=u''):
+        """
+        Adds an user to a channel, creating the user if needed.
+
+        :return: the user.
+        :rtype: :class:`User`
+        """
+        key = self.fold(nick)
+        user = self.users.get(key)
+        if user is None:
+            user = self.users[key] = User(key, nick)
+        chan.members[user.key] = prefixes
+        user.channels.add(chan.key)
+        return user
+
+    def _remove_member(self, chan, key):
+        """
+        Removes an user from a channel, and forgets it if it isn't on any other channel.
+        """
+        chan.members.pop(key, None)
+        user = self.users.get(key)
+        if user is not None:
+            user.channels.discard(chan.key)
+            if not user.channels:
+                del self.users[key]
+
+    def _leave(self, chan):
+        """
+        Forgets a channel the bot left.
+        """
+        for key in chan.members.keys():
+            self._remove_member(chan, key)
+        del self.channels[chan.key]
+
+    def _on_connected(self, msg):
+        self.nick = msg.args[0]
+
+    def _on_join(self, msg):
+        key = self.fold(msg.args[0])
+        if self._is_me(self.fold(msg.src.name)):
+            chan = self.channels.get(key)
+            if chan is not None:
+                self._leave(chan)
+            chan = self.channels[key] = Channel(key, msg.args[0])
+        else:
+            chan = self.channels.get(key)
+            if chan is None:
+                return
+        user = self._add_member(chan, msg.src.name)
+        user.user, user.host = msg.src.user, msg.src.host
+
+    def _on_part(self, msg):
+        self._on_removed(msg.args[0], msg.src.name)
+
+    def _on_kick(self, msg):
+        self._on_removed(msg.args[0], msg.args[1])
+
+    def _on_removed(self, channel, nick):
+        chan = self.channels.get(self.fold(channel))
+        if chan is None:
+            return
+        key = self.fold(nick)
+        if self._is_me(key):
+            self._leave(chan)
+        else:
+            self._remove_member(chan, key)
+
+    def _on_quit(self, msg):
+        user = self.users.pop(self.fold(msg.src.name), None)
+        if user is None:
+            return
+        for key in user.channels:
+            self.channels[key].members.pop(user.key, None)
+
+    def _on_nick(self, msg):
+        old_key, new_nick = self.fold(msg.src.name), msg.args[0]
+        if self._is_me(old_key):
+            self.nick = new_nick
+        user = self.users.pop(old_key, None)
+        if user is None:
+            return
+        user.nick = new_nick
+        user.key = self.fold(new_nick)
+        self.users[user.key] = user
+        for key in user.channels:
+            members = self.channels[key].members
+            members[user.key] = members.pop(old_key)
+
+    def _on_mode(self, msg):
+        chan = self.channels.get(self.fold(msg.args[0]))
+        if chan is None:
+            return
+        prefixes = self.prefixes
+        params = iter(msg.args[2:])
+        adding = True
+        for mode in msg.args[1]:
+            if mode == u'+':
+                adding = True
+            elif mode == u'-':
+                adding = False
+            elif mode in prefixes:
+                key = self.fold(next(params, u''))
+                current = chan.members.get(key)
+                if current is None:
+                    continue
+                symbol = prefixes[mode]
+                if adding:
+                    chan.members[key] = u''.join(
+                        s for s in prefixes.itervalues() if (s == symbol) or (s in current)
+                    )
+                else:
+                    chan.members[key] = current.replace(symbol, u'')
+            elif (mode in self.param_modes) or (adding and (mode in self._set_only_modes)):
+                next(params, None)
+
+    def _on_names(self, msg):
+        chan = self.channels.get(self.fold(msg.args[2]))
+        if chan is None:
+            return
+        symbols = u''.join(self.prefixes.itervalues())
+        for name in msg.args[3:]:
+            start = 0
+            while name[start:start + 1] in symbols and start < len(name) - 1:
+                start += 1
+            nick, _, userhost = name[start:].partition(u'!')
+            user = self._add_member(chan, nick, name[:start])
+            if userhost:
+                user.user, _, user.host = userhost.partition(u'@')
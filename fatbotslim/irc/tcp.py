@@ -24,6 +24,7 @@ This module contains the low-level networking stuff.
 """
 
 from fatbotslim.irc import sslwrap_patch
+from fatbotslim.irc.text import truncate
 
 from gevent import spawn, joinall, killall
 from gevent.queue import Queue
@@ -36,12 +37,57 @@ from fatbotslim.log import create_logger
 log = create_logger(__name__)
 
 
+class LineBuffer(object):
+    """
+    Incremental line splitter for data received from the server.
+
+    Received chunks are appended to a :class:`bytearray`, and only the newly
+    received bytes are scanned for line endings, so bursts of many lines are
+    split in linear time. Both ``\\r\\n`` and bare ``\\n`` line endings are
+    accepted, empty lines are ignored.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scanned = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def feed(self, data):
+        """
+        Appends received data to the buffer and extracts complete lines.
+
+        :param data: data received from the server.
+        :type data: str
+        :return: complete lines, without their line ending.
+        :rtype: list
+        """
+        buf = self._buffer
+        buf.extend(data)
+        lines = []
+        start = 0
+        end = buf.find('\n', self._scanned)
+        while end != -1:
+            line_end = end
+            if line_end > start and buf[line_end - 1] == 13:  # '\r'
+                line_end -= 1
+            if line_end > start:
+                lines.append(str(buf[start:line_end]))
+            start = end + 1
+            end = buf.find('\n', start)
+        if start:
+            del buf[:start]
+        self._scanned = len(buf)
+        return lines
+
+
 class TCP(object):
     """
     A TCP connection.
     """
 
-    def __init__(self, host, port, timeout=300):
+    def __init__(self, host, port, timeout=300, recv_size=4096):
         """
         :param host: server's hostname
         :type host: str
@@ -49,12 +95,14 @@ class TCP(object):
         :type port: int
         :param timeout: maximum time a request/response should last.
         :type timeout: int
+        :param recv_size: maximum amount of bytes to read from the socket at once.
+        :type recv_size: int
         """
         self.host = host
         self.port = port
         self.timeout = timeout
-        self._ibuffer = ''
-        self._obuffer = ''
+        self.recv_size = recv_size
+        self._ibuffer = LineBuffer()
         self.iqueue = Queue()
         self.oqueue = Queue()
         self._socket = self._create_socket()
@@ -76,39 +124,53 @@ class TCP(object):
         """
         while True:
             try:
-                data = self._socket.recv(4096)
-                self._ibuffer += data
-                while '\r\n' in self._ibuffer:
-                    line, self._ibuffer = self._ibuffer.split('\r\n', 1)
+                data = self._socket.recv(self.recv_size)
+                if not data:
+                    break
+                for line in self._ibuffer.feed(data):
                     self.iqueue.put(line)
             except Exception:
                 break
 
+    @staticmethod
+    def _format_line(line):
+        """
+        Prepares a line to be sent to the server.
+
+        :param line: line to send.
+        :type line: str
+        :return: the line's first 500 bytes (without cutting a character), terminated with ``\\r\\n``.
+        :rtype: str
+        """
+        return truncate(line.splitlines()[0], 500) + '\r\n'
+
     def _send_loop(self):
         """
         Waits for data in the output queue to send.
+        All the lines queued at once are sent using a single write.
         """
         while True:
             try:
-                line = self.oqueue.get().splitlines()[0][:500]
-                self._obuffer += line + '\r\n'
-                while self._obuffer:
-                    sent = self._socket.send(self._obuffer)
-                    self._obuffer = self._obuffer[sent:]
+                lines = [self._format_line(self.oqueue.get())]
+                while not self.oqueue.empty():
+                    lines.append(self._format_line(self.oqueue.get_nowait()))
+                self._socket.sendall(''.join(lines))
             except Exception:
                 break
 
     def connect(self):
         """
         Connects the socket and spawns the send/receive loops.
+        Returns when the connection is lost, the socket is then closed.
         """
         jobs = []
         self._socket.connect((self.host, self.port))
         try:
             jobs = [spawn(self._recv_loop), spawn(self._send_loop)]
-            joinall(jobs)
+            joinall(jobs, count=1)
         finally:
             killall(jobs)
+            self.disconnect()
 
     def disconnect(self):
         """
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+.. module:: fatbotslim.irc.text
+
+.. moduleauthor:: Mathieu D. (MatToufoutu)
+
+This module contains helpers to cut outgoing text to the size allowed by the protocol.
+
+All the functions work on UTF-8 encoded strings, and only slice them,
+lines are never cut in the middle of a character or of a color code.
+"""
+
+import re
+
+#: Maximum length of a line, including the ``\r\n`` terminator.
+MAX_LINE_SIZE = 512
+
+#: Length assumed for the ``user@host`` part of the bot's prefix until the real one is known.
+USERHOST_SIZE = 75
+
+color_re = re.compile(r'\x03(?:\d{1,2}(?:,\d{1,2})?)?')
+
+
+def encode(value):
+    """
+    Converts a value to a UTF-8 encoded string, :class:`str` values are assumed
+    to be already encoded and are returned unchanged.
+
+    :param value: value to encode.
+    :return: the UTF-8 encoded string.
+    :rtype: str
+    """
+    if isinstance(value, str):
+        return value
+    return u'{0}'.format(value).encode('utf-8')
+
+
+def _cut(data, start, end):
+    """
+    Finds where to cut `data` so that ``data[start:end]`` doesn't end in
+    the middle of a character or of a color code.
+
+    :param data: UTF-8 encoded string, longer than `end`.
+    :type data: str
+    :param start: start of the piece to cut.
+    :type start: int
+    :param end: maximum end of the piece to cut.
+    :type end: int
+    :return: the position to cut at.
+    :rtype: int
+    """
+    limit = end
+    while (end > start) and (0x80 <= ord(data[end]) < 0xC0):
+        end -= 1
+    code = data.rfind('\x03', max(start + 1, end - 5), end)
+    if (code != -1) and (color_re.match(data, code).end() > end):
+        end = code
+    if end <= start:
+        return limit
+    return end
+
+
+def truncate(data, size):
+    """
+    Truncates `data` to at most `size` bytes.
+
+    :param data: UTF-8 encoded string.
+    :type data: str
+    :param size: maximum size of the result.
+    :type size: int
+    :return: the truncated string.
+    :rtype: str
+    """
+    if len(data) <= size:
+        return data
+    return data[:_cut(data, 0, size)]
+
+
+def split(data, size):
+    """
+    Splits `data` into pieces of at most `size` bytes.
+    Each line of `data` is split on its last space fitting in `size` bytes when
+    possible, empty lines are skipped.
+
+    :param data: UTF-8 encoded string.
+    :type data: str
+    :param size: maximum size of the pieces.
+    :type size: int
+    :return: the pieces of `data`.
+    :rtype: generator
+    """
+    for line in data.splitlines():
+        start, length = 0, len(line)
+        while length - start > size:
+            end = line.rfind(' ', start, start + size + 1)
+            if end > start:
+                yield line[start:end]
+                start = end + 1
+            else:
+                end = _cut(line, start, start + size)
+                yield line[start:end]
+                start = end
+        if start < length:
+            yield line[start:]
@@ -82,3 +82,62 @@ def create_logger(name, level='INFO'):
     logger.setLevel(level)
     logger.addHandler(handler)
     return logger
+
+
+class QueueHandler(logging.Handler):
+    """
+    A logging handler that sends records to a :class:`multiprocessing.Queue`,
+    so that logs from many processes can be displayed by a single one.
+    """
+
+    def __init__(self, queue):
+        """
+        :param queue: queue to put the records in.
+        :type queue: :class:`multiprocessing.Queue`
+        """
+        super(QueueHandler, self).__init__()
+        self.queue = queue
+
+    def emit(self, record):
+        """
+        Makes the record picklable (message arguments and exception are
+        formatted) and puts it in the queue.
+        """
+        try:
+            record.msg = '[{0}] {1}'.format(record.processName, record.getMessage())
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+def forward_logs(queue):
+    """
+    Replaces the handlers of all the existing loggers with a
+    :class:`fatbotslim.log.QueueHandler`.
+
+    :param queue: queue to send the records to.
+    :type queue: :class:`multiprocessing.Queue`
+    """
+    handler = QueueHandler(queue)
+    for logger in logging.Logger.manager.loggerDict.values():
+        if isinstance(logger, logging.Logger) and logger.handlers:
+            logger.handlers = [handler]
+
+
+def handle_forwarded_logs(queue):
+    """
+    Handles the records sent by :func:`fatbotslim.log.forward_logs`, using the
+    loggers of the current process, until `None` is received.
+
+    :param queue: queue to get the records from.
+    :type queue: :class:`multiprocessing.Queue`
+    """
+    while True:
+        record = queue.get()
+        if record is None:
+            break
+        logging.getLogger(record.name).handle(record)
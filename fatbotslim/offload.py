@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+.. module:: fatbotslim.offload
+
+.. moduleauthor:: Mathieu D. (MatToufoutu)
+
+This module runs CPU-heavy functions in a pool of worker processes, without
+blocking the gevent event loop. The pool is shared by all the bots running
+in the current process.
+"""
+
+from multiprocessing import Pool, cpu_count
+
+from gevent import get_hub
+
+_pool = None
+_processes = None
+
+
+def configure(processes):
+    """
+    Sets the amount of worker processes, must be called before the pool is used.
+
+    :param processes: amount of worker processes, `None` uses the amount of CPUs.
+    :type processes: int or None
+    """
+    global _processes
+    _processes = processes
+
+
+def get_pool():
+    """
+    Returns the workers pool, creating it on first use.
+
+    :return: the workers pool.
+    :rtype: :class:`multiprocessing.pool.Pool`
+    """
+    global _pool
+    if _pool is None:
+        _pool = Pool(_processes or cpu_count())
+    return _pool
+
+
+def run(function, *args):
+    """
+    Calls `function` in a worker process and waits for its result.
+    Only the calling greenlet waits, the result being fetched from a thread.
+
+    `function` and its arguments must be picklable, which means the function must
+    be defined at the top level of a module.
+
+    :param function: function to call.
+    :type function: callable
+    :return: the function's result.
+    :raise: any exception raised by the function.
+    """
+    result = get_pool().apply_async(function, args)
+    return get_hub().threadpool.apply(result.get)
+
+
+def shutdown():
+    """
+    Stops the worker processes.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
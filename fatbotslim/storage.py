@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of FatBotSlim.
+#
+# FatBotSlim is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# FatBotSlim is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with FatBotSlim. If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+.. module:: fatbotslim.storage
+
+.. moduleauthor:: Mathieu D. (MatToufoutu)
+
+This module contains the backends used to persist the rights managed by
+:class:`fatbotslim.handlers.RightsHandler`.
+
+Backends are only called from the gevent threadpool, so that disk accesses
+never block the event loop.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from gevent import spawn, get_hub
+from gevent.event import Event
+from gevent.lock import Semaphore
+
+from fatbotslim.log import create_logger
+
+log = create_logger(__name__)
+
+
+class Storage(object):
+    """
+    Base class for the rights storage backends.
+
+    Rights are stored as ``(command, user, event_types)`` entries, unique
+    by ``(command, user)``.
+    """
+
+    def load(self):
+        """
+        Reads all the stored rights.
+
+        :return: the stored ``(command, user, event_types)`` entries.
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def save(self, changes):
+        """
+        Writes a batch of changes.
+
+        :param changes: ``(command, user, event_types)`` entries, ``event_types``
+            being `None` for removed entries.
+        :type changes: list
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Releases the resources used by the backend.
+        """
+        pass
+
+
+class SQLiteStorage(Storage):
+    """
+    Stores rights in a SQLite database, each batch of changes is written
+    in a single transaction.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the database file.
+        :type path: str
+        """
+        self.path = path
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS rights ('
+                'command TEXT, user TEXT, events TEXT, PRIMARY KEY (command, user))'
+            )
+        return self._db
+
+    def load(self):
+        rows = self._connect().execute('SELECT command, user, events FROM rights')
+        return [(command, user, events.split(',') if events else []) for command, user, events in rows]
+
+    def save(self, changes):
+        db = self._connect()
+        with db:
+            db.executemany(
+                'INSERT OR REPLACE INTO rights (command, user, events) VALUES (?, ?, ?)',
+                [(command, user, ','.join(events)) for command, user, events in changes if events is not None]
+            )
+            db.executemany(
+                'DELETE FROM rights WHERE command = ? AND user = ?',
+                [(command, user) for command, user, events in changes if events is None]
+            )
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class JournalStorage(Storage):
+    """
+    Stores rights in an append-only journal file, one JSON entry per line.
+
+    When the journal holds more than `compact_ratio` times the amount of live
+    entries (and at least `compact_min` lines), the live entries are written to
+    a snapshot file (``<path>.snapshot``) and the journal is emptied.
+    """
+
+    def __init__(self, path, compact_ratio=4, compact_min=1000):
+        """
+        :param path: path to the journal file.
+        :type path: str
+        :param compact_ratio: journal lines per live entry that trigger a compaction.
+        :type compact_ratio: int
+        :param compact_min: minimum amount of journal lines before compacting.
+        :type compact_min: int
+        """
+        self.path = path
+        self.snapshot_path = path + '.snapshot'
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._entries = None
+        self._lines = 0
+
+    @staticmethod
+    def _apply(entries, change):
+        command, user, events = change
+        if events is None:
+            entries.pop((command, user), None)
+        else:
+            entries[(command, user)] = events
+
+    def load(self):
+        entries = OrderedDict()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as snapshot:
+                for command, user, events in json.load(snapshot):
+                    entries[(command, user)] = events
+        self._lines = 0
+        if os.path.exists(self.path):
+            with open(self.path) as journal:
+                for line in journal:
+                    try:
+                        self._apply(entries, json.loads(line))
+                    except ValueError:  # truncated last line, after a crash
+                        continue
+                    self._lines += 1
+        self._entries = entries
+        return [(command, user, events) for (command, user), events in entries.iteritems()]
+
+    def save(self, changes):
+        if self._entries is None:
+            self.load()
+        with open(self.path, 'a') as journal:
+            journal.write(''.join(json.dumps(change) + '\n' for change in changes))
+            journal.flush()
+            os.fsync(journal.fileno())
+        for change in changes:
+            self._apply(self._entries, change)
+        self._lines += len(changes)
+        if self._lines >= max(self.compact_min, self.compact_ratio * len(self._entries)):
+            self.compact()
+
+    def compact(self):
+        """
+        Writes the live entries to the snapshot file, and empties the journal.
+        """
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as snapshot:
+            json.dump([(command, user, events) for (command, user), events in self._entries.iteritems()], snapshot)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.rename(tmp_path, self.snapshot_path)
+        open(self.path, 'w').close()
+        self._lines = 0
+
+
+class BatchWriter(object):
+    """
+    Collects changes and writes them to a :class:`Storage` in batches, from the gevent
+    threadpool. Successive changes of the same entry are merged before being written.
+    """
+
+    def __init__(self, storage, batch_size=500, flush_interval=1.0):
+        """
+        :param storage: backend to write to.
+        :type storage: :class:`Storage`
+        :param batch_size: amount of pending changes that triggers an immediate write.
+        :type batch_size: int
+        :param flush_interval: maximum delay before pending changes are written, in seconds.
+        :type flush_interval: float
+        """
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = OrderedDict()
+        self._wakeup = Event()
+        self._lock = Semaphore()
+        self._greenlet = None
+
+    def put(self, command, user, event_types):
+        """
+        Schedules a change to be written.
+
+        :param command: command of the entry.
+        :type command: str
+        :param user: user of the entry.
+        :type user: str
+        :param event_types: new event types of the entry, `None` to remove it.
+        :type event_types: list or None
+        """
+        self._pending.pop((command, user), None)
+        self._pending[(command, user)] = event_types
+        if self._greenlet is None:
+            self._greenlet = spawn(self._run)
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            deadline = time.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.wait(remaining)
+                self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending changes, only the calling greenlet waits for the write.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            batch = [(command, user, events) for (command, user), events in self._pending.iteritems()]
+            self._pending.clear()
+            try:
+                get_hub().threadpool.apply(self.storage.save, (batch,))
+            except Exception:
+                log.exception('Failed to save {0} rights changes, retrying later'.format(len(batch)))
+                for command, user, events in batch:
+                    self._pending.setdefault((command, user), events)
+                self._wakeup.set()
@@ -28,7 +28,7 @@ setup(
         'Topic :: Communications :: Chat :: Internet Relay Chat',
         'Topic :: Internet',
     ],
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     include_package_data=True,
     zip_safe=False,
     install_requires=open(os.path.join(CURRENT_DIR, 'requirements.txt')).read().strip(),